@@ -1,55 +1,127 @@
 from flask import Flask, jsonify
 from flask_restful import Api
 from flask_jwt_extended import JWTManager
-from flasgger import Swagger
-from resources.movie import Movie, Movies
+from resources.movie import Movie, Movies, MovieSearch, MovieBatch, MovieFacets, MovieSimilar, MovieAutocomplete
 from resources.user import User, UserSignon, UserLogin, UserLogout, UserConfirm
-from blacklist import BLACKLIST
-import json
+from blacklist import BLACKLIST, revocation_options
+from services.autocomplete import autocomplete, autocomplete_options
+from services.catalog import catalog
+from services.search import ensure_search_index
+from services.movie_values import ensure_movie_values
+from services.compression import compressor, compression_options
+from services.dates import ensure_iso_dates
+from services.durations import ensure_duration_columns
+from services.facets import ensure_facet_counts
+from services.indexes import ensure_filter_indexes
+from services.mailer import mailer, mailer_options
+from services.passwords import hasher, hasher_options
+from services.similarity import similarity, similarity_options
+from services import metrics
+from services.templates import templates
+from sql_alchemy import db
+from sql_pool import pool, pool_options
+import conf
 
-with open("./conf/config.json") as config_json:
-    config = json.load(config_json)
+FLASK_SETTINGS = ['SQLALCHEMY_DATABASE_URI', 'SQLALCHEMY_TRACK_MODIFICATIONS', 'JWT_SECRET_KEY',
+                  'JWT_BLACKLIST_ENABLED', 'JWT_VERIFY_SUB', 'DEBUG', 'TESTING',
+                  'SIMILAR_DEFAULT_K', 'SIMILAR_MAX_K', 'AUTOCOMPLETE_LIMIT', 'AUTOCOMPLETE_MAX_LIMIT']
 
-with open("./conf/flasgger.json") as flasgger_json:
-    flasgger = json.load(flasgger_json)
-
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = config['SQLALCHEMY_DATABASE_URI']
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = config['SQLALCHEMY_TRACK_MODIFICATIONS']
-app.config['JWT_SECRET_KEY'] = config['JWT_SECRET_KEY']
-app.config['JWT_BLACKLIST_ENABLED'] = config['JWT_BLACKLIST_ENABLED']
-app.config['JWT_VERIFY_SUB'] = config['JWT_VERIFY_SUB']
-
-@app.route('/')
 def index():
     return '<h1>API de filmes do catálogo da Netflix!</h1>'
 
-@app.before_request
-def create_database():
-    app.before_request_funcs[None].remove(create_database)
-    from sql_alchemy import db
-    db.create_all()
-
-swagger = Swagger(app, template=flasgger['SWAGGER_TEMPLATE'])
-api = Api(app)
-api.add_resource(Movies, '/movies')
-api.add_resource(Movie, '/movies/<int:id>')
-api.add_resource(User, '/users/<int:id>')
-api.add_resource(UserSignon, '/signon')
-api.add_resource(UserLogin, '/login')
-api.add_resource(UserLogout, '/logout')
-api.add_resource(UserConfirm, '/confirm/<int:id>')
-jwt = JWTManager(app)
-
-@jwt.token_in_blocklist_loader
-def check_blacklist(self,token):
-    return token['jti'] in BLACKLIST
-
-@jwt.revoked_token_loader
-def invalidate_token(jwt_header, jwt_payload):
-    return jsonify({'message':'You have been disconnected.'}), 401
+def register_resources(app):
+    api = Api(app)
+    api.add_resource(Movies, '/movies')
+    api.add_resource(MovieSearch, '/movies/search')
+    api.add_resource(MovieBatch, '/movies/batch')
+    api.add_resource(MovieFacets, '/movies/facets')
+    api.add_resource(MovieAutocomplete, '/movies/autocomplete')
+    api.add_resource(Movie, '/movies/<int:id>')
+    api.add_resource(MovieSimilar, '/movies/<int:id>/similar')
+    api.add_resource(User, '/users/<int:id>')
+    api.add_resource(UserSignon, '/signon')
+    api.add_resource(UserLogin, '/login')
+    api.add_resource(UserLogout, '/logout')
+    api.add_resource(UserConfirm, '/confirm/<int:id>')
 
-if __name__ == '__main__':
-    from sql_alchemy import db
+def register_jwt(app):
+    jwt = JWTManager(app)
+
+    @jwt.token_in_blocklist_loader
+    def check_blacklist(self,token):
+        return token['jti'] in BLACKLIST
+
+    @jwt.revoked_token_loader
+    def invalidate_token(jwt_header, jwt_payload):
+        return jsonify({'message':'You have been disconnected.'}), 401
+
+def register_swagger(app):
+    from flasgger import Swagger
+    flasgger = conf.load_json(conf.FLASGGER_FILE)
+    Swagger(app, template=flasgger['SWAGGER_TEMPLATE'])
+
+def configure_services(settings):
+    """Rebuilds the process-wide services from the merged settings."""
+    BLACKLIST.configure(*revocation_options(settings))
+    compressor.configure(*compression_options(settings))
+    hasher.configure(*hasher_options(settings))
+    mailer.configure(*mailer_options(settings))
+    similarity.configure(*similarity_options(settings))
+    autocomplete.configure(*autocomplete_options(settings))
+    metrics.configure(settings['SLOW_QUERY_MS'])
+
+def initialize(app, settings):
+    """Creates the schema and warms the caches before the first request."""
+    with app.app_context():
+        pool.configure(db.engine.url.database, *pool_options(settings))
+        db.create_all()
+    with pool.write() as connection:
+        # One transaction, so a failing step leaves the schema as it was.
+        connection.execute("BEGIN")
+        ensure_duration_columns(connection)
+        ensure_search_index(connection)
+        ensure_movie_values(connection)
+        ensure_facet_counts(connection)
+        ensure_iso_dates(connection)
+        ensure_filter_indexes(connection)
+    pool.warm()
+    templates.load(auto_reload=app.debug)
+    BLACKLIST.refresh()
+    similarity.sync_current()
+    autocomplete.start()
+    if conf.filters['movies'].get('engine') == 'memory':
+        catalog.load()
+    mailer.start()
+
+def create_app(config=None):
+    """
+    Builds the application. config overrides keys of conf/config.json, e.g.
+    create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///test.db', 'SWAGGER_ENABLED': False}).
+    The services are process-wide, so the last create_app in a process
+    configures them. The table names (SQLALCHEMY_*_TABLE) are read when the
+    models are imported and cannot be overridden here.
+    """
+    settings = dict(conf.config)
+    settings.update(config or {})
+    configure_services(settings)
+
+    app = Flask(__name__)
+    for key in FLASK_SETTINGS:
+        if key in settings:
+            app.config[key] = settings[key]
     db.init_app(app)
-    app.run(debug=True)
\ No newline at end of file
+
+    app.add_url_rule('/', 'index', index)
+    if settings.get('METRICS_ENABLED', True):
+        metrics.init_app(app)
+    app.after_request(compressor)
+    if settings.get('SWAGGER_ENABLED', True):
+        register_swagger(app)
+    register_resources(app)
+    register_jwt(app)
+    initialize(app, settings)
+    return app
+
+if __name__ == '__main__':
+    app = create_app({'DEBUG': True})
+    app.run(debug=True)
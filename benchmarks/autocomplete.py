@@ -0,0 +1,52 @@
+"""
+Latency of the /movies/autocomplete lookups, without the HTTP layer. The
+prefixes are the first 1 to 8 characters of titles and names of the
+catalog; the first pass runs with the prefix caches empty except for the
+short prefixes computed at load. Run from the repository root:
+
+    python -m benchmarks.autocomplete --queries 5000
+"""
+from services.autocomplete import FIELDS, AutocompleteIndex
+from sql_pool import pool
+from conf import config as config_json
+from conf import filters as filters_json
+import argparse
+import random
+import statistics
+import time
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--queries', type=int, default=5000)
+    parser.add_argument('--limit', type=int, default=config_json['AUTOCOMPLETE_LIMIT'])
+    args = parser.parse_args()
+
+    pool.configure(filters_json['movies']['instance'])
+    index = AutocompleteIndex(pool, filters_json['movies']['table'], config_json['AUTOCOMPLETE_MAX_LIMIT'])
+    start = time.perf_counter()
+    index.load()
+    print(f"load: {(time.perf_counter() - start) * 1000:.0f} ms, "
+          + ', '.join(f"{len(field.slots)} {name}" for name, field in index.fields.items()))
+
+    rng = random.Random(42)
+    values = [value for field in index.fields.values() for value in field.values]
+    prefixes = [value[:rng.randint(1, 8)] for value in rng.choices(values, k=args.queries)]
+    print(f"{'fields':<24} {'pass':<6} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for fields in [FIELDS] + [(field,) for field in FIELDS]:
+        for name in ('cold', 'warm'):
+            timings = []
+            for prefix in prefixes:
+                start = time.perf_counter()
+                index.suggest(prefix, fields, args.limit)
+                timings.append((time.perf_counter() - start) * 1000)
+            print(f"{','.join(fields):<24} {name:<6} {statistics.median(timings):>8.3f} "
+                  f"{percentile(timings, 0.99):>8.3f} {max(timings):>8.3f}")
+        for field in index.fields.values():
+            field.cache.clear()
+
+if __name__ == '__main__':
+    main()
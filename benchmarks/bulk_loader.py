@@ -0,0 +1,52 @@
+"""
+Measures database/migration.py on synthetic catalogs built by repeating
+netflix_titles.csv with new ids. Run from the repository root:
+
+    python -m benchmarks.bulk_loader --scale 1 10 100
+"""
+from database.migration import CSV_FILE, load
+import argparse
+import os
+import pandas as pd
+import tempfile
+
+def synthetic_csv(path, scale):
+    catalog = pd.read_csv(CSV_FILE, dtype=str)
+    id_column = catalog.columns[0]
+    copies = []
+    for copy in range(scale):
+        frame = catalog.copy()
+        if copy:
+            frame[id_column] = f"{copy}-" + frame[id_column]
+        copies.append(frame)
+    pd.concat(copies).to_csv(path, index=False)
+    return len(catalog) * scale
+
+def touch_rows(path, fraction):
+    catalog = pd.read_csv(path, dtype=str)
+    changed = catalog.sample(frac=fraction, random_state=1).index
+    catalog.loc[changed, catalog.columns[-1]] += ' (updated)'
+    catalog.to_csv(path, index=False)
+    return len(changed)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', type=int, nargs='+', default=[1, 10])
+    parser.add_argument('--chunksize', type=int, default=5000)
+    args = parser.parse_args()
+
+    print(f"{'scale':>6} {'rows':>9} {'phase':<14} {'seconds':>8} {'rows/s':>10}")
+    for scale in args.scale:
+        with tempfile.TemporaryDirectory() as directory:
+            csv_file = os.path.join(directory, 'titles.csv')
+            database = os.path.join(directory, 'movie.db')
+            rows = synthetic_csv(csv_file, scale)
+            phases = [('initial load', None), ('re-import', None), ('1% changed', 0.01)]
+            for phase, fraction in phases:
+                if fraction:
+                    touch_rows(csv_file, fraction)
+                stats = load(csv_file, database, args.chunksize, verbose=False)
+                print(f"{scale:>6} {rows:>9} {phase:<14} {stats['seconds']:>8.2f} {stats['rows_per_second']:>10,.0f}")
+
+if __name__ == '__main__':
+    main()
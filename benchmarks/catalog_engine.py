@@ -0,0 +1,65 @@
+"""
+Compares the SQL filter path of GET /movies with the in-memory catalog
+engine. Run from the repository root: python -m benchmarks.catalog_engine
+"""
+from services.catalog import CatalogIndex, filters_json
+from resources.movie import build_where
+from sql_pool import pool
+import argparse
+import time
+
+QUERIES = [
+    {},
+    {'type': 'Movie'},
+    {'country': 'United States'},
+    {'type': 'TV Show', 'rating': 'TV-MA'},
+    {'type': 'Movie', 'release_year': '2019', 'rating': 'TV-14'},
+    {'listed_in': 'Documentaries', 'country': 'United States'},
+    {'listed_in': 'Dramas', 'country': 'India', 'type': 'Movie'},
+    {'cast': 'Shah Rukh Khan'},
+]
+
+def sql_query(connection, table, filters, limit):
+    where_clauses, values = build_where(filters)
+    query = f"SELECT * FROM {table}"
+    if where_clauses:
+        query += " WHERE " + " AND ".join(where_clauses)
+    query += " ORDER BY id LIMIT ?"
+    return connection.execute(query, values + [limit]).fetchall()
+
+def timed(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--limit', type=int, default=filters_json['movies']['page_size'])
+    args = parser.parse_args()
+
+    instance = filters_json['movies']['instance']
+    table = filters_json['movies']['table']
+    pool.configure(instance)
+    engine = CatalogIndex(pool, table, filters_json['movies']['filters'], filters_json['movies']['multivalued'])
+    start = time.perf_counter()
+    engine.load()
+    print(f"load: {(time.perf_counter() - start) * 1000:.1f} ms, {len(engine.order)} movies")
+
+    print(f"{'filters':<60} {'sql ms':>8} {'memory ms':>10} {'speedup':>8}")
+    for filters in QUERIES:
+        def run_sql():
+            with pool.read() as connection:
+                return sql_query(connection, table, filters, args.limit)
+        def run_memory():
+            return engine.query(filters, limit=args.limit)[0]
+        if [row[0] for row in run_sql()] != [row[0] for row in run_memory()]:
+            print(f"{str(filters):<60} results differ")
+            continue
+        sql_ms = timed(run_sql, args.repeat)
+        memory_ms = timed(run_memory, args.repeat)
+        print(f"{str(filters):<60} {sql_ms:>8.3f} {memory_ms:>10.3f} {sql_ms / memory_ms:>7.1f}x")
+
+if __name__ == '__main__':
+    main()
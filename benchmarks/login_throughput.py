@@ -0,0 +1,56 @@
+"""
+Login throughput of bcrypt verification run inline on the request threads
+versus the bounded PasswordHasher pool, and the latency a cheap request
+sees while a login burst is running. Run from the repository root:
+
+    python -m benchmarks.login_throughput --rounds 10 --threads 16 --logins 200
+"""
+from services.passwords import PasswordHasher, hash_password, verify_password
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import statistics
+import threading
+import time
+
+def cheap_request_latency(stop):
+    samples = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        sum(range(2000))
+        samples.append((time.perf_counter() - start) * 1000)
+        time.sleep(0.001)
+    return samples
+
+def burst(verify, hashed, threads, logins):
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=1) as observer:
+        latencies = observer.submit(cheap_request_latency, stop)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            results = list(executor.map(lambda _: verify('secret', hashed), range(logins)))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        samples = latencies.result()
+    assert all(results)
+    samples.sort()
+    p99 = samples[int(len(samples) * 0.99) - 1] if samples else 0.0
+    return logins / elapsed, statistics.median(samples) if samples else 0.0, p99
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    hashed = hash_password('secret', args.rounds)
+    pool = PasswordHasher(args.rounds, args.workers, args.threads * 2)
+    print(f"bcrypt rounds={args.rounds}, {args.threads} request threads, {args.logins} logins")
+    print(f"{'mode':<22} {'logins/s':>9} {'cheap p50 ms':>13} {'cheap p99 ms':>13}")
+    for mode, verify in [('inline', verify_password), (f'pool ({args.workers} workers)', pool.verify)]:
+        throughput, p50, p99 = burst(verify, hashed, args.threads, args.logins)
+        print(f"{mode:<22} {throughput:>9.1f} {p50:>13.3f} {p99:>13.3f}")
+
+if __name__ == '__main__':
+    main()
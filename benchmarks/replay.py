@@ -0,0 +1,366 @@
+"""
+Replays captured or synthetic traffic against the API and reports throughput
+and p50/p95/p99 latency per endpoint. Run from the repository root:
+
+    python -m benchmarks.replay --har requests.har --repeat 50
+    python -m benchmarks.replay --mix mixed --requests 2000 --concurrency 8
+    python -m benchmarks.replay --mix filters --url http://127.0.0.1:5000 --concurrency 16
+    python -m benchmarks.replay --mix mixed --save benchmarks/baselines/main.json
+    python -m benchmarks.replay --mix mixed --compare benchmarks/baselines/main.json
+
+Captures are HAR files (Insomnia, browsers) or JSONL files with one request per
+line: {"method": "GET", "url": "/movies?type=Movie", "headers": {}, "body": null}.
+Note that requests.jsonl in the repository root is not a traffic capture.
+
+Without --url the app is built in-process with create_app() on a copy of the
+database, with the similarity index and the revoked token store in the same
+temporary directory, so replayed writes and logouts do not touch instance/.
+With --url the requests go to a running server over HTTP and writes are real.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from conf import filters as filters_json
+from urllib.parse import urlsplit
+import argparse
+import itertools
+import json
+import os
+import random
+import re
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
+
+ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+BENCH_LOGIN = 'replay-bench'
+BENCH_PASSWORD = 'replay-bench-password'
+FILTER_QUERIES = [
+    '',
+    'type=Movie',
+    'type=TV Show&rating=TV-MA',
+    'country=United States',
+    'country=India&listed_in=Dramas',
+    'listed_in=Documentaries',
+    'release_year=2019&type=Movie',
+    'cast=Shah Rukh Khan',
+    'rating=PG-13&limit=50',
+    'type=Movie&limit=1000',
+]
+
+class Request:
+    def __init__(self, method, path, headers=None, body=None, auth=False):
+        self.method = method.upper()
+        self.path = path
+        self.headers = {key: value for key, value in (headers or {}).items()
+                        if key.lower() not in ('host', 'content-length', 'authorization')}
+        self.body = body or None
+        self.auth = auth
+
+    @property
+    def endpoint(self):
+        return f"{self.method} {ID_SEGMENT.sub('/<id>', urlsplit(self.path).path)}"
+
+def request_path(url):
+    parts = urlsplit(url)
+    return parts.path + (f"?{parts.query}" if parts.query else '')
+
+def load_har(path):
+    with open(path, encoding='utf-8') as har_file:
+        entries = json.load(har_file)['log']['entries']
+    requests = []
+    for entry in entries:
+        request = entry['request']
+        headers = {header['name']: header['value'] for header in request.get('headers', [])}
+        body = (request.get('postData') or {}).get('text')
+        auth = any(key.lower() == 'authorization' for key in headers)
+        requests.append(Request(request['method'], request_path(request['url']), headers, body, auth))
+    return requests
+
+def load_jsonl(path):
+    requests = []
+    with open(path, encoding='utf-8') as jsonl_file:
+        for line in jsonl_file:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if 'method' not in entry:
+                raise ValueError(f"{path} is not a traffic capture (lines need method and url)")
+            body = entry.get('body')
+            if body is not None and not isinstance(body, str):
+                body = json.dumps(body)
+            headers = entry.get('headers') or {}
+            auth = entry.get('auth', any(key.lower() == 'authorization' for key in headers))
+            requests.append(Request(entry['method'], request_path(entry.get('url') or entry['path']), headers, body, auth))
+    return requests
+
+class Workload:
+    """Synthetic request mixes over the ids present in the database."""
+    def __init__(self, ids, movies, seed=1):
+        self.ids = ids
+        self.movies = movies
+        self.random = random.Random(seed)
+        self.new_ids = itertools.count(900000 + seed * 10000)
+
+    def filters(self):
+        query = self.random.choice(FILTER_QUERIES)
+        return Request('GET', '/movies' + (f"?{query}" if query else ''))
+
+    def lookups(self):
+        return Request('GET', f"/movies/{self.random.choice(self.ids)}")
+
+    def logins(self):
+        body = json.dumps({'login': BENCH_LOGIN, 'password': BENCH_PASSWORD})
+        return Request('POST', '/login', {'Content-Type': 'application/json'}, body)
+
+    def writes(self):
+        id = self.random.choice(list(self.movies))
+        movie = dict(self.movies[id])
+        headers = {'Content-Type': 'application/json'}
+        if self.random.random() < 0.5:
+            return [Request('PATCH', f"/movies/{id}", headers, json.dumps(movie), auth=True)]
+        new_id = next(self.new_ids)
+        movie['id'] = str(new_id)
+        return [Request('POST', f"/movies/{new_id}", headers, json.dumps(movie), auth=True),
+                Request('DELETE', f"/movies/{new_id}", auth=True)]
+
+    def mixed(self):
+        choice = self.random.random()
+        if choice < 0.55:
+            return self.filters()
+        if choice < 0.90:
+            return self.lookups()
+        if choice < 0.95:
+            return self.logins()
+        return self.writes()
+
+    def build(self, mix, count):
+        requests = []
+        while len(requests) < count:
+            generated = getattr(self, mix)()
+            requests += generated if isinstance(generated, list) else [generated]
+        return requests
+
+class InProcessTarget:
+    def __init__(self, database):
+        from app import create_app
+        self.directory = tempfile.mkdtemp(prefix='replay-')
+        copy = os.path.join(self.directory, 'movie.db')
+        source = sqlite3.connect(database)
+        destination = sqlite3.connect(copy)
+        source.backup(destination)
+        destination.close()
+        source.close()
+        self.app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{copy}",
+                               'SIMILAR_INDEX_FILE': os.path.join(self.directory, 'similar.idx'),
+                               'REVOCATION_DATABASE': os.path.join(self.directory, 'revoked.db'),
+                               'EMAIL_WORKER_ENABLED': False,
+                               'SWAGGER_ENABLED': False,
+                               'JWT_SECRET_KEY': os.environ.get('JWT_SECRET_KEY') or 'replay-benchmark-secret-key-0123456789'})
+        self.local = threading.local()
+
+    def client(self):
+        if not hasattr(self.local, 'client'):
+            self.local.client = self.app.test_client()
+        return self.local.client
+
+    def token(self, fresh=False):
+        from flask_jwt_extended import create_access_token
+        with self.app.app_context():
+            return create_access_token(identity='1')
+
+    def send(self, method, path, headers, body):
+        response = self.client().open(path, method=method, headers=headers, data=body)
+        return response.status_code, response.get_data()
+
+    def close(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+class HttpTarget:
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self.local = threading.local()
+        self.shared_token = None
+
+    def session(self):
+        import requests
+        if not hasattr(self.local, 'session'):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def token(self, fresh=False):
+        if fresh or self.shared_token is None:
+            status, body = self.send('POST', '/login', {'Content-Type': 'application/json'},
+                                     json.dumps({'login': BENCH_LOGIN, 'password': BENCH_PASSWORD}))
+            token = json.loads(body).get('token')
+            if fresh:
+                return token
+            self.shared_token = token
+        return self.shared_token
+
+    def send(self, method, path, headers, body):
+        response = self.session().request(method, self.url + path, headers=headers, data=body)
+        return response.status_code, response.content
+
+    def close(self):
+        pass
+
+def prepare(target, sample_size=200):
+    """Creates and activates the benchmark user and samples movie ids."""
+    headers = {'Content-Type': 'application/json'}
+    status, body = target.send('POST', '/signon', headers, json.dumps(
+        {'login': BENCH_LOGIN, 'password': BENCH_PASSWORD, 'email': 'replay-bench@example.com'}))
+    if status == 201:
+        target.send('GET', f"/confirm/{json.loads(body)['user']['id']}", {}, None)
+    status, body = target.send('GET', f"/movies?limit={filters_json['movies']['max_page_size']}", {}, None)
+    movies = {}
+    for movie in json.loads(body).get('movies', []):
+        if movie['id'].isdigit():
+            movies[movie['id']] = {key: value for key, value in movie.items() if key != 'date_added'}
+    ids = list(movies)
+    return ids, dict(itertools.islice(movies.items(), sample_size))
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))]
+
+def run(target, requests, concurrency):
+    results = []
+    lock = threading.Lock()
+    shared = {}
+
+    def execute(request):
+        headers = dict(request.headers)
+        if request.auth:
+            # Logout revokes its token, so it gets one of its own.
+            fresh = request.endpoint == 'POST /logout'
+            if fresh or 'token' not in shared:
+                token = target.token(fresh)
+                if not fresh:
+                    shared['token'] = token
+            else:
+                token = shared['token']
+            headers['Authorization'] = f"Bearer {token}"
+        start = time.perf_counter()
+        try:
+            status, body = target.send(request.method, request.path, headers, request.body)
+        except Exception as e:
+            status, body = 0, str(e).encode('utf-8')
+        elapsed = time.perf_counter() - start
+        with lock:
+            results.append((request.endpoint, status, elapsed, len(body)))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(execute, requests))
+    return results, time.perf_counter() - start
+
+def summarize(results, wall):
+    endpoints = {}
+    for endpoint, status, elapsed, size in results:
+        endpoints.setdefault(endpoint, []).append((status, elapsed, size))
+    endpoints['ALL'] = [(status, elapsed, size) for _, status, elapsed, size in results]
+    summary = {}
+    for endpoint, samples in endpoints.items():
+        latencies = sorted(elapsed * 1000 for _, elapsed, _ in samples)
+        statuses = {}
+        for status, _, _ in samples:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        summary[endpoint] = {
+            'requests': len(samples),
+            'errors': sum(1 for status, _, _ in samples if status == 0 or status >= 500),
+            'statuses': statuses,
+            'rps': len(samples) / wall if wall else 0.0,
+            'p50': percentile(latencies, 0.50),
+            'p95': percentile(latencies, 0.95),
+            'p99': percentile(latencies, 0.99),
+            'bytes': sum(size for _, _, size in samples) / len(samples),
+        }
+    return summary
+
+def report(summary, baseline=None, threshold=10.0):
+    header = f"{'endpoint':<26} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+    if baseline:
+        header += f" {'p50 diff':>9} {'p95 diff':>9}"
+    print(header)
+    regressions = []
+    for endpoint, row in sorted(summary.items(), key=lambda item: (item[0] == 'ALL', item[0])):
+        line = (f"{endpoint:<26} {row['requests']:>8} {row['errors']:>6} {row['rps']:>8.1f} "
+                f"{row['p50']:>8.2f} {row['p95']:>8.2f} {row['p99']:>8.2f}")
+        previous = (baseline or {}).get(endpoint)
+        if previous:
+            diffs = []
+            for key in ('p50', 'p95'):
+                diff = (row[key] - previous[key]) / previous[key] * 100 if previous[key] else 0.0
+                diffs.append(diff)
+                if diff > threshold:
+                    regressions.append(f"{endpoint} {key} {previous[key]:.2f} -> {row[key]:.2f} ms ({diff:+.0f}%)")
+            line += f" {diffs[0]:>+8.0f}% {diffs[1]:>+8.0f}%"
+        print(line)
+    return regressions
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay captured or synthetic traffic and report latency per endpoint.')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--har')
+    source.add_argument('--jsonl')
+    source.add_argument('--mix', choices=['filters', 'lookups', 'logins', 'writes', 'mixed'], default='mixed')
+    parser.add_argument('--requests', type=int, default=1000, help='Synthetic requests to generate')
+    parser.add_argument('--repeat', type=int, default=1, help='Times to replay a capture')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--url', help='Base URL of a running server (default: in-process test client)')
+    parser.add_argument('--database', default=filters_json['movies']['instance'])
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--warmup', type=int, default=50)
+    parser.add_argument('--save', help='Write the results as a baseline JSON file')
+    parser.add_argument('--compare', help='Baseline JSON file to compare against')
+    parser.add_argument('--threshold', type=float, default=10.0, help='Latency increase (%%) reported as a regression')
+    args = parser.parse_args()
+
+    target = HttpTarget(args.url) if args.url else InProcessTarget(args.database)
+    try:
+        ids, movies = prepare(target)
+        if args.har:
+            requests = load_har(args.har) * args.repeat
+        elif args.jsonl:
+            requests = load_jsonl(args.jsonl) * args.repeat
+        else:
+            workload = Workload(ids, movies, args.seed)
+            run(target, workload.build('filters', args.warmup) + workload.build('lookups', args.warmup), args.concurrency)
+            requests = workload.build(args.mix, args.requests)
+        results, wall = run(target, requests, args.concurrency)
+    finally:
+        target.close()
+
+    summary = summarize(results, wall)
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)['endpoints']
+    mode = args.url or 'in-process'
+    print(f"{len(results)} requests in {wall:.2f}s, concurrency {args.concurrency}, {mode}")
+    regressions = report(summary, baseline, args.threshold)
+    for regression in regressions:
+        print(f"regression: {regression}")
+
+    if args.save:
+        directory = os.path.dirname(args.save)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.save, 'w', encoding='utf-8') as baseline_file:
+            json.dump({'commit': git_commit(),
+                       'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       'arguments': vars(args),
+                       'endpoints': summary}, baseline_file, indent=2)
+        print(f"baseline saved to {args.save}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Compares the previous GET /movies serialization (one dict per row built by
+hand, encoded by the stdlib json module as Flask-RESTful does) with
+services.serializer, with and without orjson. Run from the repository root:
+python -m benchmarks.serializer
+"""
+from services.catalog import filters_json
+from services import serializer
+from sql_pool import pool
+from datetime import date
+import argparse
+import json
+import time
+
+def row_json(line):
+    return {
+        'id': line[0],
+        'type': line[1],
+        'title': line[2],
+        'director': line[3],
+        'cast': line[4],
+        'country': line[5],
+        'date_added': line[6],
+        'release_year': line[7],
+        'rating': line[8],
+        'duration': line[9],
+        'listed_in': line[10],
+        'description': line[11]
+    }
+
+def previous(rows, columns):
+    return json.dumps({'movies': [row_json(line) for line in rows], 'next': None, 'message': 'Movie entries found.'}).encode('utf-8')
+
+def current(rows, columns):
+    return serializer.encode_envelope('movies', rows, columns, next=None, message='Movie entries found.')
+
+def timed(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - start) / repeat * 1000, len(result)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    pool.configure(filters_json['movies']['instance'])
+    with pool.read() as connection:
+        cursor = connection.execute(f"SELECT * FROM {filters_json['movies']['table']} ORDER BY id")
+        rows = cursor.fetchall()
+        columns = serializer.columns_of(cursor)
+    print(f"{len(rows)} movies")
+
+    orjson = serializer.orjson
+    for size in (100, 1000, len(rows)):
+        sample = rows[:size]
+        results = [('previous (dict + json)', *timed(lambda: previous(sample, columns), args.repeat))]
+        serializer.orjson = None
+        serializer.row_encoder.cache_clear()
+        results.append(('serializer (fallback)', *timed(lambda: current(sample, columns), args.repeat)))
+        serializer.orjson = orjson
+        serializer.row_encoder.cache_clear()
+        if orjson is not None:
+            results.append(('serializer (orjson)', *timed(lambda: current(sample, columns), args.repeat)))
+        baseline = results[0][1]
+        for name, ms, length in results:
+            print(f"{size:>6} rows  {name:<24} {ms:>8.2f} ms {length:>10} bytes {baseline / ms:>6.1f}x")
+
+    dates = [date(2000 + index % 22, index % 12 + 1, index % 28 + 1) for index in range(len(rows))]
+    strftime_ms = timed(lambda: [value.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z' for value in dates], args.repeat)[0]
+    cached_ms = timed(lambda: [serializer.format_datetime(value) for value in dates], args.repeat)[0]
+    print(f"{len(dates)} dates  strftime {strftime_ms:.2f} ms, format_datetime {cached_ms:.2f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Latency of GET /movies/<id>/similar at the current catalog size and at
+larger synthetic catalogs. The index is built from the movie table, then
+copied scale times with noise added to the vectors, and top-k queries are
+timed on the memory-mapped copy. Run from the repository root:
+
+    python -m benchmarks.similarity --scale 1 10 100
+"""
+from services.similarity import HEADER, HEADER_BYTES, SimilarityIndex, normalize
+from sql_pool import pool
+from conf import config as config_json
+from conf import filters as filters_json
+import argparse
+import numpy as np
+import os
+import statistics
+import tempfile
+import time
+
+def scaled_copy(base, scale, path, rng):
+    index = SimilarityIndex(base.pool, base.table, path, base.dimensions, dict(zip(base.fields, base.weights)))
+    count = base.get('count')
+    with open(path, 'wb') as file:
+        file.truncate(index.offsets(count * scale)[2])
+    mapping = np.memmap(path, dtype=np.uint8, mode='r+')
+    header = np.array(base.header)
+    header[HEADER.index('count')] = header[HEADER.index('capacity')] = count * scale
+    mapping[:HEADER_BYTES].view(np.int64)[:] = header
+    index.attach(mapping)
+    index.idf[:] = base.idf
+    ids = [id.decode('utf-8') for id in base.ids[:count]]
+    for copy in range(scale):
+        start = copy * count
+        index.ids[start:start + count] = ids if copy == 0 else [f"{id}.{copy}" for id in ids]
+        vectors = np.array(base.vectors[:count])
+        if copy:
+            vectors += rng.normal(0, 0.02, vectors.shape).astype(np.float32)
+        index.vectors[start:start + count] = normalize(vectors)
+    mapping.flush()
+    index.inode = os.stat(path).st_ino
+    return index, ids
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=config_json['SIMILAR_DEFAULT_K'])
+    args = parser.parse_args()
+
+    pool.configure(filters_json['movies']['instance'])
+    rng = np.random.default_rng(42)
+    with tempfile.TemporaryDirectory() as folder:
+        base = SimilarityIndex(pool, filters_json['movies']['table'], os.path.join(folder, 'base.idx'),
+                               config_json['SIMILAR_DIMENSIONS'], config_json['SIMILAR_FIELD_WEIGHTS'])
+        start = time.perf_counter()
+        base.build()
+        print(f"build: {(time.perf_counter() - start) * 1000:.0f} ms, {base.get('count')} movies, "
+              f"{base.dimensions} dimensions")
+        print(f"{'scale':>6} {'movies':>10} {'file MB':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for scale in args.scale:
+            path = os.path.join(folder, f"scale{scale}.idx")
+            index, ids = scaled_copy(base, scale, path, rng)
+            sample = rng.choice(ids, size=args.queries)
+            index.similar(sample[0], args.k)
+            timings = []
+            for id in sample:
+                start = time.perf_counter()
+                index.similar(id, args.k)
+                timings.append((time.perf_counter() - start) * 1000)
+            print(f"{scale:>6} {index.get('count'):>10} {os.path.getsize(path) / 2 ** 20:>9.0f} "
+                  f"{statistics.median(timings):>8.2f} {percentile(timings, 0.95):>8.2f} {percentile(timings, 0.99):>8.2f}")
+            del index
+            os.remove(path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""
+Cold start of a worker process: time to import the application, to build it
+with create_app (schema check, caches warmed) and to answer the first and
+second requests. Each run is a fresh interpreter, like a respawned worker.
+Run from the repository root: python -m benchmarks.startup --runs 5
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+WORKER = """
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app({'EMAIL_WORKER_ENABLED': False, 'SWAGGER_ENABLED': %(swagger)r})
+created = time.perf_counter()
+client = application.test_client()
+client.get(%(path)r)
+first = time.perf_counter()
+client.get(%(path)r)
+second = time.perf_counter()
+print(json.dumps({'import': imported - start, 'create_app': created - imported,
+                  'first request': first - created, 'second request': second - first}))
+"""
+
+def run(path, swagger):
+    output = subprocess.run([sys.executable, '-c', WORKER % {'path': path, 'swagger': swagger}],
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--path', default='/movies?limit=100')
+    parser.add_argument('--no-swagger', action='store_true')
+    args = parser.parse_args()
+
+    samples = [run(args.path, not args.no_swagger) for _ in range(args.runs)]
+    print(f"{args.runs} cold starts, first request {args.path}")
+    for step in samples[0]:
+        values = [sample[step] * 1000 for sample in samples]
+        print(f"{step:<16} median {statistics.median(values):>8.1f} ms  max {max(values):>8.1f} ms")
+
+if __name__ == '__main__':
+    main()
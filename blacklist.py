@@ -1 +1,137 @@
-BLACKLIST = set()
\ No newline at end of file
+from collections import OrderedDict
+from conf import config
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+class BloomFilter:
+    def __init__(self, bits, hashes):
+        self.bits = bits
+        self.hashes = hashes
+        self.array = bytearray((bits + 7) // 8)
+
+    def positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.bits for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self.positions(key):
+            self.array[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self.array[position >> 3] & (1 << (position & 7)) for position in self.positions(key))
+
+class RevocationStore:
+    """
+    Revoked token ids shared by every worker process through a SQLite table.
+    Each process keeps a Bloom filter of the revoked ids, caught up with the
+    table at most every sync_interval seconds, so checking a token that was
+    never revoked does not touch the database. Entries are deleted once the
+    token has expired.
+    """
+    def __init__(self, database, bloom_bits, bloom_hashes, cache_size, sync_interval, purge_interval):
+        self.lock = threading.Lock()
+        self.connection = None
+        self.configure(database, bloom_bits, bloom_hashes, cache_size, sync_interval, purge_interval)
+
+    def configure(self, database, bloom_bits, bloom_hashes, cache_size, sync_interval, purge_interval):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+            self.database = database
+            self.bloom_bits = bloom_bits
+            self.bloom_hashes = bloom_hashes
+            self.cache_size = cache_size
+            self.sync_interval = sync_interval
+            self.purge_interval = purge_interval
+            self.reset()
+
+    def reset(self):
+        self.bloom = BloomFilter(self.bloom_bits, self.bloom_hashes)
+        self.cache = OrderedDict()
+        self.last_id = 0
+        self.last_sync = 0.0
+        self.last_purge = time.time()
+
+    def connect(self):
+        if self.connection is None:
+            directory = os.path.dirname(self.database)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.connection = sqlite3.connect(self.database, check_same_thread=False, isolation_level=None)
+            self.connection.execute("PRAGMA journal_mode = WAL")
+            self.connection.execute("PRAGMA busy_timeout = 5000")
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS tb_revoked_token (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    jti TEXT NOT NULL UNIQUE,
+                    exp INTEGER NOT NULL)
+            """)
+            self.connection.execute("CREATE INDEX IF NOT EXISTS ix_tb_revoked_token_exp ON tb_revoked_token (exp)")
+        return self.connection
+
+    def add(self, jti, exp=None):
+        if exp is None:
+            exp = 2 ** 62
+        with self.lock:
+            self.connect().execute(
+                "INSERT INTO tb_revoked_token (jti, exp) VALUES (?, ?) ON CONFLICT(jti) DO UPDATE SET exp = excluded.exp",
+                (jti, int(exp)))
+            self.bloom.add(jti)
+            self.remember(jti, True)
+
+    def remember(self, jti, revoked):
+        self.cache[jti] = revoked
+        self.cache.move_to_end(jti)
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def sync(self):
+        now = time.time()
+        if now - self.last_sync < self.sync_interval:
+            return
+        self.last_sync = now
+        connection = self.connect()
+        if now - self.last_purge >= self.purge_interval:
+            self.last_purge = now
+            if connection.execute("DELETE FROM tb_revoked_token WHERE exp <= ?", (int(now),)).rowcount:
+                self.reset()
+                self.last_sync = now
+        rows = connection.execute(
+            "SELECT id, jti FROM tb_revoked_token WHERE id > ? ORDER BY id", (self.last_id,)).fetchall()
+        for id, jti in rows:
+            self.bloom.add(jti)
+            self.cache.pop(jti, None)
+            self.last_id = id
+
+    def refresh(self):
+        with self.lock:
+            self.sync()
+
+    def __contains__(self, jti):
+        with self.lock:
+            self.sync()
+            if jti not in self.bloom:
+                return False
+            if jti in self.cache:
+                self.cache.move_to_end(jti)
+                return self.cache[jti]
+            revoked = self.connect().execute(
+                "SELECT 1 FROM tb_revoked_token WHERE jti = ? AND exp > ?", (jti, int(time.time()))).fetchone() is not None
+            self.remember(jti, revoked)
+            return revoked
+
+def revocation_options(config):
+    return (config['REVOCATION_DATABASE'],
+            config['REVOCATION_BLOOM_BITS'],
+            config['REVOCATION_BLOOM_HASHES'],
+            config['REVOCATION_CACHE_SIZE'],
+            config['REVOCATION_SYNC_INTERVAL'],
+            config['REVOCATION_PURGE_INTERVAL'])
+
+BLACKLIST = RevocationStore(*revocation_options(config))
@@ -0,0 +1,16 @@
+"""
+Configuration files, parsed once per process. Every module imports the
+parsed dicts from here; create_app(config) layers overrides on top.
+"""
+import json
+
+CONFIG_FILE = './conf/config.json'
+FILTERS_FILE = './database/filters.json'
+FLASGGER_FILE = './conf/flasgger.json'
+
+def load_json(path):
+    with open(path, encoding='utf-8') as json_file:
+        return json.load(json_file)
+
+config = load_json(CONFIG_FILE)
+filters = load_json(FILTERS_FILE)
@@ -1,39 +1,159 @@
+"""
+Bulk loader for the Netflix titles CSV. Run from the repository root:
+
+    python -m database.migration [--csv FILE] [--database FILE] [--chunksize N]
+
+Rows are upserted by id in chunked transactions, so the loader can be re-run
+on an existing database: new titles are inserted, changed titles updated and
+unchanged titles left untouched. The country and listed_in join tables and
+the filter terms are rewritten only for the titles that changed. When the table starts empty
+the full-text and facet triggers are dropped during the load, and the
+full-text index, join tables and facet counts are rebuilt once at the end.
+"""
+from models.movie import MovieModel
+from services.dates import parse_date
+from services.durations import ensure_duration_columns, parse_duration
+from services.facets import ensure_facet_counts, drop_facet_triggers, rebuild_facet_counts
+from services.indexes import ensure_filter_indexes
+from services.movie_values import rebuild_movie_values, sync_movie_values
+from services.search import ensure_search_index, drop_search_triggers, rebuild_search_index
+from services.versioning import bump_version
+from sql_pool import apply_pragmas
+from sqlalchemy import create_engine
+from conf import filters as filters_json
+import argparse
 import pandas as pd
 import sqlite3
+import time
 
-def escape_sql(value):
-    if value == 'nan':
-        return 'null'
-    value = value.replace("'", "''")
-    return f"'{value}'"
+CSV_FILE = 'database/netflix_titles.csv'
+TABLE = filters_json['movies']['table']
+CSV_COLUMNS = ['id', 'type', 'title', 'director', 'cast', 'country', 'date_added',
+               'release_year', 'rating', 'duration', 'listed_in', 'description']
+COLUMNS = CSV_COLUMNS + ['duration_minutes', 'seasons']
 
-def convert_date(date_str):
+def ensure_schema(database):
+    engine = create_engine(f"sqlite:///{database}")
     try:
-        return pd.to_datetime(date_str, format='%B %d, %Y').strftime('%Y-%m-%d')
-    except Exception:
-        return date_str
-
-csv_file = 'netflix_titles.csv'
-sql_file = 'migration.sql'
-table_name = 'tb_movie'
-instance = '../instance/movie.db'
-
-dt = pd.read_csv(csv_file)
-
-if 'data_added' in dt.columns:
-    dt['data_added'] = dt['data_added'].apply(convert_date)
-
-with open(sql_file, 'w', encoding='utf-8') as f_sql, sqlite3.connect(instance) as connection:
-   try:
-       cursor = connection.cursor()
-   except sqlite3.Error as e:
-        print(f'Database error: {e}')
-   for i, row in dt.iterrows():
-       columns = dt.columns.to_list()
-       values = [escape_sql(str(convert_date(row[col]))) for col in columns]
-       sql = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join(values)});\n"
-       f_sql.write(sql)
-       try:
-           cursor.execute(sql)
-       except sqlite3.Error as e:
-           print(f'Database error: {e}')
+        MovieModel.metadata.create_all(engine)
+    finally:
+        engine.dispose()
+
+def upsert_statement():
+    columns = ', '.join(f'"{column}"' for column in COLUMNS)
+    placeholders = ', '.join('?' for _ in COLUMNS)
+    updates = ', '.join(f'"{column}" = excluded."{column}"' for column in COLUMNS[1:])
+    current = ', '.join(f'{TABLE}."{column}"' for column in COLUMNS[1:])
+    incoming = ', '.join(f'excluded."{column}"' for column in COLUMNS[1:])
+    return (f"INSERT INTO {TABLE} ({columns}) VALUES ({placeholders}) "
+            f"ON CONFLICT(id) DO UPDATE SET {updates} WHERE ({current}) IS NOT ({incoming})")
+
+def convert_dates(values):
+    parsed = pd.to_datetime(values.str.strip(), format='%B %d, %Y', errors='coerce')
+    return parsed.dt.strftime('%Y-%m-%d').where(parsed.notna(), values.map(parse_date))
+
+def prepare(chunk):
+    chunk.columns = [column.strip().strip("'\"") for column in chunk.columns]
+    chunk = chunk[CSV_COLUMNS].copy()
+    for column in CSV_COLUMNS:
+        if column != 'release_year':
+            chunk[column] = chunk[column].str.strip()
+    chunk['date_added'] = convert_dates(chunk['date_added'])
+    chunk['release_year'] = pd.to_numeric(chunk['release_year'], errors='coerce').astype('Int64')
+    durations = chunk['duration'].map(parse_duration)
+    chunk['duration_minutes'] = pd.array([minutes for minutes, _ in durations], dtype='Int64')
+    chunk['seasons'] = pd.array([seasons for _, seasons in durations], dtype='Int64')
+    chunk = chunk.astype(object).where(chunk.notna(), None)
+    return list(chunk.itertuples(index=False, name=None))
+
+def track_changes(connection):
+    connection.executescript(f"""
+        CREATE TEMP TABLE IF NOT EXISTS changed_movie (id TEXT PRIMARY KEY);
+        CREATE TEMP TRIGGER IF NOT EXISTS changed_movie_ai AFTER INSERT ON main.{TABLE} BEGIN
+            INSERT OR IGNORE INTO changed_movie (id) VALUES (new.id);
+        END;
+        CREATE TEMP TRIGGER IF NOT EXISTS changed_movie_au AFTER UPDATE ON main.{TABLE} BEGIN
+            INSERT OR IGNORE INTO changed_movie (id) VALUES (new.id);
+        END;
+    """)
+
+def sync_changed(connection):
+    ids = [row[0] for row in connection.execute("SELECT id FROM changed_movie")]
+    sync_movie_values(connection, ids)
+    connection.execute("DELETE FROM changed_movie")
+
+def load(csv_file, database, chunksize=5000, verbose=True):
+    ensure_schema(database)
+    statement = upsert_statement()
+    stats = {'rows': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0, 'seconds': 0.0}
+    start = time.perf_counter()
+    connection = sqlite3.connect(database, isolation_level=None)
+    try:
+        apply_pragmas(connection)
+        connection.execute("BEGIN")
+        ensure_duration_columns(connection)
+        ensure_search_index(connection)
+        ensure_facet_counts(connection)
+        count = lambda: connection.execute(f"SELECT COUNT(*) FROM {TABLE}").fetchone()[0]
+        bulk = count() == 0
+        if bulk:
+            drop_search_triggers(connection)
+            drop_facet_triggers(connection)
+        connection.execute("COMMIT")
+        if not bulk:
+            track_changes(connection)
+        try:
+            for chunk in pd.read_csv(csv_file, dtype=str, chunksize=chunksize):
+                rows = prepare(chunk)
+                before = count()
+                connection.execute("BEGIN")
+                try:
+                    changed = connection.executemany(statement, rows).rowcount
+                    if not bulk:
+                        sync_changed(connection)
+                    connection.execute("COMMIT")
+                except sqlite3.Error:
+                    connection.execute("ROLLBACK")
+                    raise
+                inserted = count() - before
+                stats['rows'] += len(rows)
+                stats['inserted'] += inserted
+                stats['updated'] += changed - inserted
+                stats['unchanged'] += len(rows) - changed
+                if verbose:
+                    elapsed = time.perf_counter() - start
+                    print(f"{stats['rows']} rows, {stats['rows'] / elapsed:,.0f} rows/s")
+        finally:
+            if bulk:
+                connection.execute("BEGIN")
+                ensure_search_index(connection)
+                rebuild_search_index(connection)
+                rebuild_movie_values(connection)
+                rebuild_facet_counts(connection)
+                ensure_facet_counts(connection)
+                connection.execute("COMMIT")
+        if stats['inserted'] or stats['updated']:
+            connection.execute("BEGIN")
+            bump_version(connection)
+            connection.execute("COMMIT")
+        ensure_filter_indexes(connection)
+        connection.execute("PRAGMA optimize")
+    finally:
+        connection.close()
+    stats['seconds'] = time.perf_counter() - start
+    stats['rows_per_second'] = stats['rows'] / stats['seconds'] if stats['seconds'] else 0.0
+    if verbose:
+        print(f"{stats['rows']} rows in {stats['seconds']:.2f}s ({stats['rows_per_second']:,.0f} rows/s): "
+              f"{stats['inserted']} inserted, {stats['updated']} updated, {stats['unchanged']} unchanged")
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description='Load the Netflix titles CSV into the movie table.')
+    parser.add_argument('--csv', default=CSV_FILE)
+    parser.add_argument('--database', default=filters_json['movies']['instance'])
+    parser.add_argument('--chunksize', type=int, default=5000)
+    args = parser.parse_args()
+    load(args.csv, args.database, args.chunksize)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,8 @@
+"""
+Tables that no resource queries through the ORM. They are imported here so
+db.create_all() creates them wherever a model is imported.
+"""
+from models.movie_facet import MovieFacetModel
+from models.movie_value import MovieCountryModel, MovieGenreModel, MovieTermModel
+
+__all__ = ['MovieCountryModel', 'MovieFacetModel', 'MovieGenreModel', 'MovieTermModel']
@@ -0,0 +1,25 @@
+from sql_alchemy import db
+from services.versioning import utcnow
+from conf import config
+
+class CatalogVersionModel(db.Model):
+    __tablename__ = config['SQLALCHEMY_CATALOG_VERSION_TABLE']
+    id = db.Column(db.Integer, primary_key = True)
+    version = db.Column(db.Integer, nullable = False, default=0)
+    modify_date = db.Column(db.DateTime, nullable = False, default=utcnow)
+
+    @classmethod
+    def current(cls):
+        catalog_version = cls.query.filter_by(id=1).first()
+        if catalog_version:
+            return catalog_version.version, catalog_version.modify_date
+        return 0, None
+
+    @classmethod
+    def bump(cls):
+        updated = cls.query.filter_by(id=1).update({
+            cls.version: cls.version + 1,
+            cls.modify_date: utcnow()
+        })
+        if not updated:
+            db.session.add(cls(id=1, version=1, modify_date=utcnow()))
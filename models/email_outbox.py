@@ -0,0 +1,24 @@
+from sql_alchemy import db
+from services.versioning import utcnow
+from conf import config
+
+class EmailOutboxModel(db.Model):
+    __tablename__ = config['SQLALCHEMY_EMAIL_OUTBOX_TABLE']
+    __table_args__ = (db.Index(f"ix_{config['SQLALCHEMY_EMAIL_OUTBOX_TABLE'].lower()}_due", 'status', 'next_attempt_date'),)
+    id = db.Column(db.Integer, primary_key = True)
+    recipient = db.Column(db.String(50), nullable = False)
+    subject = db.Column(db.String(200), nullable = False)
+    html = db.Column(db.Text, nullable = False)
+    status = db.Column(db.String(10), nullable = False, default='pending')
+    attempts = db.Column(db.Integer, nullable = False, default=0)
+    last_error = db.Column(db.String(500), nullable = True)
+    next_attempt_date = db.Column(db.DateTime, nullable = False, default=utcnow)
+    create_date = db.Column(db.DateTime, nullable = False, default=utcnow)
+    sent_date = db.Column(db.DateTime, nullable = True)
+
+    @classmethod
+    def enqueue(cls, recipient, subject, html):
+        """Adds the message to the current session; it is stored with the caller's commit."""
+        message = cls(recipient=recipient, subject=subject, html=html)
+        db.session.add(message)
+        return message
@@ -1,10 +1,28 @@
 from flask_restful import reqparse
 from sql_alchemy import db
+from models.catalog_version import CatalogVersionModel
+from services.autocomplete import autocomplete
+from services.catalog import catalog
+from services.durations import parse_duration
+from services.movie_values import sync_movie_values
+from services.similarity import similarity
+from services.serializer import format_datetime
+from sqlalchemy.orm import load_only
 from datetime import datetime
-import json
+from conf import config
 
-with open("./conf/config.json") as config_json:
-    config = json.load(config_json)
+MOVIE_FIELDS = {
+    'type': (str, True),
+    'title': (str, True),
+    'director': (str, False),
+    'cast': (str, False),
+    'country': (str, False),
+    'release_year': (int, True),
+    'rating': (str, False),
+    'duration': (str, False),
+    'listed_in': (str, True),
+    'description': (str, True)
+}
 
 class MovieModel(db.Model):
     __tablename__ = config['SQLALCHEMY_MOVIE_TABLE']
@@ -20,6 +38,8 @@ class MovieModel(db.Model):
     duration = db.Column(db.String(15))
     listed_in = db.Column(db.String(200), nullable = False)
     description = db.Column(db.String(9999), nullable = False)
+    duration_minutes = db.Column(db.Integer)
+    seasons = db.Column(db.Integer)
     
     def __init__(self, id, type, title, director, cast, country, release_year, rating, duration, listed_in, description):
         self.id = id
@@ -31,6 +51,7 @@ class MovieModel(db.Model):
         self.release_year = release_year
         self.rating = rating
         self.duration = duration
+        self.duration_minutes, self.seasons = parse_duration(duration)
         self.listed_in = listed_in
         self.description = description
     
@@ -51,7 +72,28 @@ class MovieModel(db.Model):
         data = parameters.parse_args()
         return data
     
-    def json(self):
+    @staticmethod
+    def validate_movie(data, partial=False):
+        if not isinstance(data, dict):
+            return None, 'The field movie must be an object.'
+        movie = {}
+        for field, (kind, required) in MOVIE_FIELDS.items():
+            if data.get(field) is None:
+                if required and (not partial or field in data):
+                    return None, f'The field {field} cannot be null.'
+                continue
+            try:
+                movie[field] = kind(data[field])
+            except (TypeError, ValueError):
+                return None, f'The field {field} must be {"an integer" if kind is int else "a string"}.'
+        return movie, None
+
+    def json(self, fields=None):
+        if fields is not None:
+            movie = {field: getattr(self, field) for field in fields}
+            if 'date_added' in movie:
+                movie['date_added'] = self.convert_datetime_json(movie['date_added'])
+            return movie
         return {
             'id': self.id,
             'type': self.type,
@@ -64,24 +106,118 @@ class MovieModel(db.Model):
             'rating': self.rating,
             'duration': self.duration,
             'listed_in': self.listed_in,
-            'description': self.description
+            'description': self.description,
+            'duration_minutes': self.duration_minutes,
+            'seasons': self.seasons
         }
         
     def convert_datetime_json(self,datetime):
-        if datetime is not None:
-            return datetime.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
-        return datetime
+        return format_datetime(datetime)
         
     @classmethod
-    def find_movie(cls,id):
-        movie = cls.query.filter_by(id=id).first()
+    def find_movie(cls,id,fields=None):
+        query = cls.query
+        if fields is not None:
+            query = query.options(load_only(*[getattr(cls, field) for field in fields]))
+        movie = query.filter_by(id=id).first()
         if movie:
             return movie
         return None
+
+    @classmethod
+    def column_names(cls):
+        return list(cls.__table__.columns.keys())
         
+    @classmethod
+    def commit_changes(cls, *ids):
+        db.session.flush()
+        sync_movie_values(db.session.connection().connection.dbapi_connection, ids)
+        CatalogVersionModel.bump()
+        db.session.commit()
+        for copy in (catalog, similarity, autocomplete):
+            try:
+                copy.refresh(*ids)
+            except Exception as e:
+                # The write is committed, so it must not fail: the copy reloads on its next sync.
+                print(f"Error refreshing {type(copy).__name__}: {e}")
+                copy.invalidate()
+
+    @classmethod
+    def apply_batch(cls, operations):
+        results = [None] * len(operations)
+        planned = []
+        for index, operation in enumerate(operations):
+            result = {'index': index}
+            results[index] = result
+            if not isinstance(operation, dict):
+                result.update(status=400, message='Each operation must be an object.')
+                continue
+            op = operation.get('op')
+            data = operation.get('movie') or {}
+            id = operation.get('id')
+            if id is None and isinstance(data, dict):
+                id = data.get('id')
+            result.update(op=op, id=None if id is None else str(id))
+            if op not in ('insert', 'patch', 'delete'):
+                result.update(status=400, message='The field op must be insert, patch or delete.')
+                continue
+            if id is None or str(id) == '':
+                result.update(status=400, message='The field id cannot be null.')
+                continue
+            movie = None
+            if op != 'delete':
+                movie, message = cls.validate_movie(data, partial=(op == 'patch'))
+                if message:
+                    result.update(status=400, message=message)
+                    continue
+            planned.append((result, op, str(id), movie))
+
+        ids = {id for _, _, id, _ in planned}
+        existing = {movie.id: movie for movie in cls.query.filter(cls.id.in_(ids)).all()} if ids else {}
+        deleted = set()
+        changed = []
+        for result, op, id, data in planned:
+            movie = existing.get(id)
+            if op == 'insert':
+                if movie:
+                    result.update(status=409, message='Id {} already exists.'.format(id))
+                    continue
+                if id in deleted:
+                    db.session.flush()
+                movie = cls(id=id, **{field: data.get(field) for field in MOVIE_FIELDS})
+                db.session.add(movie)
+                existing[id] = movie
+                result.update(status=201, message='Movie entry successfully inserted.')
+            elif not movie:
+                result.update(status=404, message='Movie entry not found.')
+                continue
+            elif op == 'patch':
+                for field, value in data.items():
+                    setattr(movie, field, value)
+                if 'duration' in data:
+                    movie.duration_minutes, movie.seasons = parse_duration(data['duration'])
+                result.update(status=200, message='Movie entry successfully updated.')
+            else:
+                if movie in db.session.new:
+                    db.session.expunge(movie)
+                else:
+                    db.session.delete(movie)
+                del existing[id]
+                deleted.add(id)
+                result.update(status=200, message='Movie entry deleted.')
+            changed.append(id)
+
+        if changed:
+            try:
+                cls.commit_changes(*changed)
+            except Exception:
+                db.session.rollback()
+                raise
+        return results
+
     def insert_movie(self):
         db.session.add(self)
-        db.session.commit()
+        self.commit_changes(self.id)
         
     def update_movie(self,type,title,release_year,listed_in,description,director=None,cast=None,country=None,rating=None,duration=None):
         self.type = type
@@ -99,9 +235,10 @@ class MovieModel(db.Model):
             self.rating = rating
         if duration is not None:
             self.duration = duration
+            self.duration_minutes, self.seasons = parse_duration(duration)
         db.session.add(self)
-        db.session.commit()
+        self.commit_changes(self.id)
         
     def delete_movie(self):
         db.session.delete(self)
-        db.session.commit()
\ No newline at end of file
+        self.commit_changes(self.id)
\ No newline at end of file
@@ -0,0 +1,8 @@
+from sql_alchemy import db
+from conf import config
+
+class MovieFacetModel(db.Model):
+    __tablename__ = config['SQLALCHEMY_MOVIE_FACET_TABLE']
+    facet = db.Column(db.String(20), primary_key = True)
+    value = db.Column(db.String(200, collation='NOCASE'), primary_key = True)
+    count = db.Column(db.Integer, nullable = False, default=0)
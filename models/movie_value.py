@@ -0,0 +1,27 @@
+from sqlalchemy.orm import declared_attr
+from sql_alchemy import db
+from conf import config
+
+class MovieValueMixin:
+    movie_id = db.Column(db.String(7), primary_key = True)
+    name = db.Column(db.String(200, collation='NOCASE'), primary_key = True)
+
+    @declared_attr.directive
+    def __table_args__(cls):
+        return (db.Index(f"ix_{cls.__tablename__.lower()}_name", 'name', 'movie_id'),)
+
+class MovieCountryModel(MovieValueMixin, db.Model):
+    __tablename__ = config['SQLALCHEMY_MOVIE_COUNTRY_TABLE']
+
+class MovieGenreModel(MovieValueMixin, db.Model):
+    __tablename__ = config['SQLALCHEMY_MOVIE_GENRE_TABLE']
+
+class MovieTermModel(db.Model):
+    """Each value of a multivalued field and every run of whole words in it, for the filters."""
+    __tablename__ = config['SQLALCHEMY_MOVIE_TERM_TABLE']
+    field = db.Column(db.String(20), primary_key = True)
+    term = db.Column(db.String(200, collation='NOCASE'), primary_key = True)
+    movie_id = db.Column(db.String(7), primary_key = True)
+
+    __table_args__ = (db.Index(f"ix_{config['SQLALCHEMY_MOVIE_TERM_TABLE'].lower()}_movie_id", 'movie_id'),
+                      {'sqlite_with_rowid': False})
@@ -1,13 +1,11 @@
 from flask_restful import reqparse
 from flask import request, url_for
 from sql_alchemy import db
-import requests
-import bcrypt
+from models.email_outbox import EmailOutboxModel
+from services.passwords import hasher
+from services.templates import templates
 from datetime import datetime
-import json
-
-with open("./conf/config.json") as config_json:
-    config = json.load(config_json)
+from conf import config
 
 class UserModel(db.Model):
     __tablename__ = config['SQLALCHEMY_USER_TABLE']
@@ -35,19 +33,10 @@ class UserModel(db.Model):
         data = parameters.parse_args()
         return data
     
-    def send_confirmation_email(self):
+    def queue_confirmation_email(self):
         endpoint = request.url_root[:-1] + url_for('userconfirm', id = self.id)
-        with open("templates/user_activation.html", encoding="utf-8") as f:
-            html = f.read().replace("{{link}}", endpoint).replace("{{nome}}", self.login)
-            try:
-                return requests.post(
-                    "https://api.mailgun.net/v3/sandboxf8b2ef7d3e284c88916492b8f3bb185c.mailgun.org/messages",
-                    auth=("api", config['EMAIL_API_KEY']),
-                    data={"from": "no-reply <postmaster@sandboxf8b2ef7d3e284c88916492b8f3bb185c.mailgun.org>",
-                        "to": f"<{self.email}>",
-                        "subject": f"Confirmação de Cadastro da API da Netflix",
-                        "html": html})
-            except: return {'message': 'Error sending email.'}
+        html = templates.render('user_activation.html', link=endpoint, nome=self.login)
+        return EmailOutboxModel.enqueue(self.email, "Confirmação de Cadastro da API da Netflix", html)
     
     def json(self):
         return {
@@ -60,11 +49,17 @@ class UserModel(db.Model):
         }
         
     def set_password(self,password):
-        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        return hasher.hash(password)
         
     @classmethod
     def check_password(cls,password_api,password_db):
-        return bcrypt.checkpw(password_api.encode('utf-8'), password_db.encode('utf-8'))
+        return hasher.verify(password_api, password_db)
+
+    def rehash_password(self,password):
+        if hasher.needs_rehash(self.password):
+            self.password = self.set_password(password)
+            db.session.add(self)
+            db.session.commit()
         
     def convert_datetime_json(self,datetime):
         if datetime is not None:
@@ -92,13 +87,21 @@ class UserModel(db.Model):
             return user
         return None
         
-    def insert_user(self):
+    def insert_user(self, send_confirmation=False):
         db.session.add(self)
-        db.session.commit()
+        try:
+            if send_confirmation:
+                db.session.flush()
+                self.queue_confirmation_email()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
         
     def update_user(self,login,password,email,active=None):
         self.login = login
-        self.password = self.set_password(password)
+        if hasher.needs_rehash(self.password) or not self.check_password(password, self.password):
+            self.password = self.set_password(password)
         self.email = email
         if active is not None:
             self.active = active
@@ -1,16 +1,242 @@
-from flask import request
+from flask import current_app, request, Response
 from flask_restful import Resource
 from flask_jwt_extended import jwt_required
 from models.movie import MovieModel
+from models.catalog_version import CatalogVersionModel
+from services.autocomplete import FIELDS as AUTOCOMPLETE_FIELDS, autocomplete
+from services.catalog import catalog
+from sql_pool import pool
+from services.facets import facet_counts, filtered_facet_counts
+from services.movie_values import TERMS_TABLE
+from services.search import search_movies
+from services.similarity import similarity
+from services.serializer import columns_of, dumps, encode_envelope, json_response, row_encoder
+from services.versioning import current_version, make_etag, cache_headers, is_not_modified, not_modified
+from datetime import date
+from conf import filters as filters_json
+import base64
+import binascii
 import json
 import sqlite3
 
-with open("./conf/config.json") as config_json_file:
-    config_json = json.load(config_json_file)
-    
-with open("./database/filters.json") as filters_json_file:
-    filters_json = json.load(filters_json_file)
-    
+SQLITE_MIN_INTEGER = -2 ** 63
+SQLITE_MAX_INTEGER = 2 ** 63 - 1
+
+def is_cursor_value(value):
+    # bool is an int, and SQLite raises OverflowError past 64 bits.
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, int):
+        return SQLITE_MIN_INTEGER <= value <= SQLITE_MAX_INTEGER
+    return value is None or isinstance(value, (str, float))
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    try:
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (binascii.Error, UnicodeError, ValueError):
+        return None
+    if not isinstance(values, list):
+        return None
+    if not all(is_cursor_value(value) for value in values):
+        return None
+    return values
+
+def parse_limit(value):
+    page_size = filters_json['movies']['page_size']
+    max_page_size = filters_json['movies']['max_page_size']
+    if value is None or value == '':
+        return page_size
+    try:
+        limit = int(value)
+    except ValueError:
+        return None
+    if limit < 1:
+        return None
+    return min(limit, max_page_size)
+
+def parse_filters():
+    filters = {}
+    allowed_filters = filters_json['movies']['filters']
+    for key in allowed_filters:
+        value = request.args.get(key)
+        if value:
+            filters[key] = value
+    return filters
+
+def parse_fields():
+    """Requested columns with id first, None for every column, or an error message."""
+    value = request.args.get('fields')
+    if not value:
+        return None, None
+    columns = MovieModel.column_names()
+    fields = ['id']
+    for field in value.split(','):
+        field = field.strip()
+        if not field or field in fields:
+            continue
+        if field not in columns:
+            return None, 'Unknown field {}.'.format(field)
+        fields.append(field)
+    return fields, None
+
+def select_list(fields):
+    if fields is None:
+        return '*'
+    return ', '.join(f'"{field}"' for field in fields)
+
+def project(rows, columns, fields):
+    if fields is None:
+        return rows, columns
+    positions = [columns.index(field) for field in fields]
+    return [tuple(row[position] for position in positions) for row in rows], tuple(fields)
+
+def build_where(filters):
+    where_clauses = []
+    values = []
+    multivalued = filters_json['movies']['multivalued']
+    for key in filters:
+        if key == 'release_year':
+            where_clauses.append(f"{key} = ?")
+            values.append(filters[key])
+        elif key in multivalued:
+            where_clauses.append(f"id IN (SELECT movie_id FROM {TERMS_TABLE} WHERE field = ? AND term = ?)")
+            values += [key, ' '.join(filters[key].split())]
+        else:
+            where_clauses.append(f'"{key}" = ? COLLATE NOCASE')
+            values.append(filters[key])
+    return where_clauses, values
+
+DEFAULT_ORDER = [('id', False)]
+
+def column_type(column):
+    return MovieModel.__table__.columns[column].type.python_type
+
+def parse_bound(column, value):
+    if column_type(column) is int:
+        bound = int(value)
+        if not SQLITE_MIN_INTEGER <= bound <= SQLITE_MAX_INTEGER:
+            raise ValueError(value)
+        return bound
+    return date.fromisoformat(value).isoformat()
+
+def parse_ranges():
+    """(column, operator, value) bounds of the range parameters, or an error message."""
+    bounds = []
+    for column, (lower, upper) in filters_json['movies'].get('ranges', {}).items():
+        for name, operator in ((lower, '>='), (upper, '<=')):
+            value = request.args.get(name)
+            if not value:
+                continue
+            try:
+                bounds.append((column, operator, parse_bound(column, value)))
+            except ValueError:
+                expected = 'an integer' if column_type(column) is int else 'a date (YYYY-MM-DD)'
+                return None, 'The field {} must be {}.'.format(name, expected)
+    return bounds, None
+
+def build_ranges(bounds):
+    return [f'"{column}" {operator} ?' for column, operator, _ in bounds], [value for _, _, value in bounds]
+
+def sort_order(keys):
+    """Sort keys closed by id, in the direction of the last key, so every row has one place."""
+    if keys and keys[-1][0] == 'id':
+        return keys
+    return keys + [('id', keys[-1][1] if keys else False)]
+
+def parse_sort():
+    """(column, descending) order of sort=, e.g. sort=-release_year,title, or an error message."""
+    value = request.args.get('sort')
+    if not value:
+        return DEFAULT_ORDER, None
+    sortable = filters_json['movies'].get('sortable', []) + ['id']
+    keys = []
+    for key in value.split(','):
+        key = key.strip()
+        if not key:
+            continue
+        column, _, direction = key.partition(':')
+        descending = column.startswith('-')
+        column = column.lstrip('-')
+        if direction:
+            if direction.lower() not in ('asc', 'desc'):
+                return None, 'The sort direction of {} must be asc or desc.'.format(column)
+            descending = direction.lower() == 'desc'
+        if column not in sortable:
+            return None, 'Unknown sort field {}.'.format(column)
+        if column in [key for key, _ in keys]:
+            continue
+        keys.append((column, descending))
+        if column == 'id':
+            break
+    return sort_order(keys), None
+
+def sort_expression(column):
+    if column != 'id' and column_type(column) is str:
+        return f'"{column}" COLLATE NOCASE'
+    return f'"{column}"'
+
+def build_order(order):
+    return ', '.join(f"{sort_expression(column)} {'DESC' if descending else 'ASC'}" for column, descending in order)
+
+def build_keyset(order, after):
+    """
+    Clauses for the rows after the cursor values in the given order. NULL sorts
+    first in SQLite: below every value ascending and above them descending.
+    """
+    alternatives = []
+    values = []
+    equal = []
+    equal_values = []
+    for (column, descending), value in zip(order, after):
+        expression = sort_expression(column)
+        if value is None:
+            clause, clause_values = (None, []) if descending else (f'"{column}" IS NOT NULL', [])
+        elif descending:
+            clause, clause_values = f'({expression} < ? OR "{column}" IS NULL)', [value]
+        else:
+            clause, clause_values = f"{expression} > ?", [value]
+        if clause:
+            alternatives.append(" AND ".join(equal + [clause]))
+            values += equal_values + clause_values
+        equal.append(f'"{column}" IS NULL' if value is None else f"{expression} = ?")
+        equal_values += [] if value is None else [value]
+    if len(alternatives) == 1:
+        return alternatives, values
+    clauses = ["(" + " OR ".join(f"({alternative})" for alternative in alternatives) + ")"] if alternatives else ["0"]
+    # The leading key bounds the index range, so later pages seek instead of
+    # scanning from the first row.
+    column, descending = order[0]
+    if after[0] is not None and (not descending or not MovieModel.__table__.columns[column].nullable):
+        clauses.insert(0, f"{sort_expression(column)} {'<=' if descending else '>='} ?")
+        values.insert(0, after[0])
+    return clauses, values
+
+def wants_stream():
+    if request.args.get('stream', '').lower() in ('1', 'true', 'yes', 'ndjson'):
+        return True
+    best = request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson'])
+    return best == 'application/x-ndjson'
+
+def stream_movies(query, values):
+    connection = pool.acquire()
+    try:
+        cursor = connection.execute(query, values)
+        encoder = row_encoder(columns_of(cursor))
+        while True:
+            rows = cursor.fetchmany(500)
+            if not rows:
+                break
+            yield encoder.encode_lines(rows)
+    except sqlite3.Error as e:
+        yield json.dumps({'message': f'Database error: {str(e)}'}) + '\n'
+    finally:
+        pool.release(connection)
+
 class Movies(Resource):
     def get(self):
         """
@@ -28,7 +254,7 @@ class Movies(Resource):
             name: country
             type: string
             required: false
-            description: Filter by country
+            description: Filter by country (matches any of the title's countries, or whole words of one, e.g. Korea)
           - in: query
             name: release_year
             type: integer
@@ -43,65 +269,465 @@ class Movies(Resource):
             name: listed_in
             type: string
             required: false
-            description: Filter by genre/category
+            description: Filter by genre/category (matches any of the title's genres, or whole words of one, e.g. Dramas matches TV Dramas)
+          - in: query
+            name: cast
+            type: string
+            required: false
+            description: Filter by cast member (full name or whole words of it)
+          - in: query
+            name: release_year_min
+            type: integer
+            required: false
+            description: Released in or after this year
+          - in: query
+            name: release_year_max
+            type: integer
+            required: false
+            description: Released in or before this year
+          - in: query
+            name: date_added_from
+            type: string
+            format: date
+            required: false
+            description: Added on or after this date (YYYY-MM-DD)
+          - in: query
+            name: date_added_to
+            type: string
+            format: date
+            required: false
+            description: Added on or before this date (YYYY-MM-DD)
+          - in: query
+            name: duration_minutes_min
+            type: integer
+            required: false
+            description: Runtime of at least this many minutes (movies)
+          - in: query
+            name: duration_minutes_max
+            type: integer
+            required: false
+            description: Runtime of at most this many minutes (movies)
+          - in: query
+            name: seasons_min
+            type: integer
+            required: false
+            description: At least this many seasons (TV shows)
+          - in: query
+            name: seasons_max
+            type: integer
+            required: false
+            description: At most this many seasons (TV shows)
+          - in: query
+            name: sort
+            type: string
+            required: false
+            description: Comma-separated sort keys, -key or key:desc for descending (title, release_year, date_added, rating, type, duration_minutes, seasons)
+          - in: query
+            name: limit
+            type: integer
+            required: false
+            description: Page size (default and maximum set in database/filters.json)
+          - in: query
+            name: after
+            type: string
+            required: false
+            description: Opaque cursor returned as next by the previous page
+          - in: query
+            name: count
+            type: boolean
+            required: false
+            description: Include the total number of matching movies
+          - in: query
+            name: stream
+            type: boolean
+            required: false
+            description: Stream every matching movie as NDJSON (same as Accept application/x-ndjson)
+          - in: query
+            name: fields
+            type: string
+            required: false
+            description: Comma-separated columns to return (id is always included)
         responses:
           200:
             description: Movies found
+          304:
+            description: Catalog not modified since the given ETag
+          400:
+            description: Invalid limit, cursor, field, range or sort key
           404:
             description: No movie entries found
           500:
             description: Database error
         """
-        filters = {}
-        allowed_filters = filters_json['movies']['filters']
-        for key in allowed_filters:
-            value = request.args.get(key)
-            if value:
-                filters[key] = value
-
-        movies = []
+        filters = parse_filters()
+
+        limit = parse_limit(request.args.get('limit'))
+        if limit is None:
+            return {'message': 'The field limit must be a positive integer.'}, 400
+        bounds, message = parse_ranges()
+        if message:
+            return {'message': message}, 400
+        order, message = parse_sort()
+        if message:
+            return {'message': message}, 400
+        after = None
+        if request.args.get('after'):
+            after = decode_cursor(request.args.get('after'))
+            if not after or len(after) != len(order):
+                return {'message': 'The field after is not a valid cursor.'}, 400
+        with_count = request.args.get('count', '').lower() in ('1', 'true', 'yes')
+        fields, message = parse_fields()
+        if message:
+            return {'message': message}, 400
+        if fields is not None:
+            fields += [column for column, _ in order if column not in fields]
+
+        table = filters_json['movies']['table']
+        where_clauses, values = build_where(filters)
+        range_clauses, range_values = build_ranges(bounds)
+        where_clauses += range_clauses
+        values += range_values
+        if after:
+            keyset_clauses, keyset_values = build_keyset(order, after)
+            where_clauses += keyset_clauses
+            values += keyset_values
+
+        stream = wants_stream()
+
+        total = None
         try:
-            with sqlite3.connect(filters_json['movies']['instance']) as connection:
+            with pool.read() as connection:
+                version, modify_date = current_version(connection)
+                etag = make_etag(version, request.path, sorted(request.args.items(multi=True)), stream)
+                headers = cache_headers(etag, modify_date)
+                if is_not_modified(etag, modify_date):
+                    return not_modified(headers)
+
+                if stream:
+                    query = f"SELECT {select_list(fields)} FROM {table}"
+                    if where_clauses:
+                        query += " WHERE " + " AND ".join(where_clauses)
+                    query += " ORDER BY " + build_order(order)
+                    if request.args.get('limit'):
+                        query += " LIMIT ?"
+                        values.append(limit)
+                    return Response(stream_movies(query, values), mimetype='application/x-ndjson', headers=headers)
+
+                # The in-memory index answers equality filters in id order only.
+                if filters_json['movies'].get('engine') == 'memory' and not bounds and order == DEFAULT_ORDER:
+                    catalog.sync(version)
+                    rows, total = catalog.query(filters, after[0] if after else None, limit + 1, with_count)
+                    rows, columns = project(rows, catalog.columns, fields)
+                    return self.page(rows, columns, limit, total, headers)
+
                 cursor = connection.cursor()
-                base_query = f"SELECT * FROM {filters_json['movies']['table']}"
-                where_clauses = []
-                values = []
-
-                for key in filters:
-                    if key == 'release_year':
-                        where_clauses.append(f"{key} = ?")
-                        values.append(filters[key])
-                    else:
-                        where_clauses.append(f"UPPER({key}) = UPPER(?)")
-                        values.append(filters[key])
+                if with_count:
+                    count_clauses, count_values = build_where(filters)
+                    count_clauses += range_clauses
+                    count_values += range_values
+                    count_query = f"SELECT COUNT(*) FROM {table}"
+                    if count_clauses:
+                        count_query += " WHERE " + " AND ".join(count_clauses)
+                    total = cursor.execute(count_query, count_values).fetchone()[0]
 
+                base_query = f"SELECT {select_list(fields)} FROM {table}"
                 if where_clauses:
                     base_query += " WHERE " + " AND ".join(where_clauses)
+                base_query += f" ORDER BY {build_order(order)} LIMIT ?"
+                values.append(limit + 1)
 
                 result = cursor.execute(base_query, values)
-                for line in result:
-                    movies.append({
-                        'id': line[0],
-                        'type': line[1],
-                        'title': line[2],
-                        'director': line[3],
-                        'cast': line[4],
-                        'country': line[5],
-                        'date_added': line[6],
-                        'release_year': line[7],
-                        'rating': line[8],
-                        'duration': line[9],
-                        'listed_in': line[10],
-                        'description': line[11]
-                    })
+                rows = result.fetchall()
+                columns = columns_of(result)
         except sqlite3.Error as e:
             return {'message': f'Database error: {str(e)}'}, 500
-        if movies:
-            return {'movies': movies,
-                    'message': 'Movie entries found.'
-            }, 200
-        return {'message':'No movie entries found.'}, 404
+        return self.page(rows, columns, limit, total, headers, order)
+
+    @staticmethod
+    def page(rows, columns, limit, total=None, headers=None, order=DEFAULT_ORDER):
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor([rows[-1][columns.index(column)] for column, _ in order])
+        if rows:
+            fields = {'next': next_cursor, 'message': 'Movie entries found.'}
+            if total is not None:
+                fields['total'] = total
+            return json_response(encode_envelope('movies', rows, columns, **fields), 200, headers)
+        return {'message':'No movie entries found.'}, 404, headers
     
+class MovieSimilar(Resource):
+    def get(self, id):
+        """
+        Titles most similar to a movie by description, genres, cast and director
+        ---
+        tags:
+          - Movies
+        parameters:
+          - in: path
+            name: id
+            type: string
+            required: true
+            description: Movie id
+          - in: query
+            name: k
+            type: integer
+            required: false
+            description: Number of similar titles (default and maximum set in conf/config.json)
+          - in: query
+            name: fields
+            type: string
+            required: false
+            description: Comma-separated columns to return (id is always included)
+        responses:
+          200:
+            description: Similar movies, most similar first, with their cosine similarity
+          304:
+            description: Catalog not modified since the given ETag
+          400:
+            description: Invalid k or unknown field
+          404:
+            description: Movie entry not found or without similar titles
+          500:
+            description: Database error
+        """
+        try:
+            k = int(request.args.get('k') or current_app.config['SIMILAR_DEFAULT_K'])
+        except ValueError:
+            k = 0
+        if k < 1:
+            return {'message': 'The field k must be a positive integer.'}, 400
+        k = min(k, current_app.config['SIMILAR_MAX_K'])
+        fields, message = parse_fields()
+        if message:
+            return {'message': message}, 400
+
+        table = filters_json['movies']['table']
+        rows = []
+        try:
+            with pool.read() as connection:
+                version, modify_date = current_version(connection)
+                etag = make_etag(version, request.path, sorted(request.args.items(multi=True)))
+                headers = cache_headers(etag, modify_date)
+                if is_not_modified(etag, modify_date):
+                    return not_modified(headers)
+                similarity.sync(version)
+                neighbours = similarity.similar(id, k)
+                if neighbours is None:
+                    return {'message': 'Movie entry not found.'}, 404, headers
+                if neighbours:
+                    placeholders = ', '.join('?' for _ in neighbours)
+                    cursor = connection.execute(f"SELECT {select_list(fields)} FROM {table} WHERE id IN ({placeholders})",
+                                                [neighbour for neighbour, _ in neighbours])
+                    columns = columns_of(cursor) + ('similarity',)
+                    found = {row[0]: row for row in cursor}
+                    rows = [found[neighbour] + (round(score, 4),) for neighbour, score in neighbours if neighbour in found]
+        except sqlite3.Error as e:
+            return {'message': f'Database error: {str(e)}'}, 500
+        if rows:
+            return json_response(encode_envelope('movies', rows, columns, message='Movie entries found.'), 200, headers)
+        return {'message':'No similar movie entries found.'}, 404, headers
+
+class MovieAutocomplete(Resource):
+    def get(self):
+        """
+        Typeahead suggestions of titles, directors and cast members
+        ---
+        tags:
+          - Movies
+        parameters:
+          - in: query
+            name: prefix
+            type: string
+            required: true
+            description: Start of the title or name, or of any of its words (case and accents are ignored)
+          - in: query
+            name: field
+            type: string
+            required: false
+            description: Restrict suggestions to title, director or cast
+          - in: query
+            name: limit
+            type: integer
+            required: false
+            description: Number of suggestions (default and maximum set in conf/config.json)
+        responses:
+          200:
+            description: Suggestions, people with more titles and recent titles first
+          304:
+            description: Catalog not modified since the given ETag
+          400:
+            description: Missing prefix, unknown field or invalid limit
+          500:
+            description: Database error
+        """
+        prefix = request.args.get('prefix', '').strip()
+        if not prefix:
+            return {'message': 'The field prefix cannot be null.'}, 400
+        fields = AUTOCOMPLETE_FIELDS
+        if request.args.get('field'):
+            if request.args.get('field') not in AUTOCOMPLETE_FIELDS:
+                return {'message': 'The field field must be one of {}.'.format(', '.join(AUTOCOMPLETE_FIELDS))}, 400
+            fields = (request.args.get('field'),)
+        try:
+            limit = int(request.args.get('limit') or current_app.config['AUTOCOMPLETE_LIMIT'])
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            return {'message': 'The field limit must be a positive integer.'}, 400
+        limit = min(limit, current_app.config['AUTOCOMPLETE_MAX_LIMIT'])
+
+        try:
+            with pool.read() as connection:
+                version, modify_date = current_version(connection)
+        except sqlite3.Error as e:
+            return {'message': f'Database error: {str(e)}'}, 500
+        etag = make_etag(version, request.path, sorted(request.args.items(multi=True)))
+        headers = cache_headers(etag, modify_date)
+        if is_not_modified(etag, modify_date):
+            return not_modified(headers)
+        autocomplete.sync(version)
+        suggestions = autocomplete.suggest(prefix, fields, limit)
+        return json_response(dumps({'suggestions': suggestions}), 200, headers)
+
+class MovieSearch(Resource):
+    def get(self):
+        """
+        Full-text search on title, description, director and cast
+        ---
+        tags:
+          - Movies
+        parameters:
+          - in: query
+            name: q
+            type: string
+            required: true
+            description: Search terms (a term ending with * is a prefix query)
+          - in: query
+            name: prefix
+            type: boolean
+            required: false
+            description: Treat every term as a prefix
+          - in: query
+            name: limit
+            type: integer
+            required: false
+            description: Maximum number of results
+        responses:
+          200:
+            description: Movies found, best match first
+          400:
+            description: Missing search terms or invalid limit
+          404:
+            description: No movie entries found
+          500:
+            description: Database error
+        """
+        q = request.args.get('q', '').strip()
+        if not q:
+            return {'message': 'The field q cannot be null.'}, 400
+        limit = parse_limit(request.args.get('limit'))
+        if limit is None:
+            return {'message': 'The field limit must be a positive integer.'}, 400
+        prefix = request.args.get('prefix', '').lower() in ('1', 'true', 'yes')
+
+        try:
+            with pool.read() as connection:
+                version, modify_date = current_version(connection)
+                etag = make_etag(version, request.path, sorted(request.args.items(multi=True)))
+                headers = cache_headers(etag, modify_date)
+                if is_not_modified(etag, modify_date):
+                    return not_modified(headers)
+                cursor = search_movies(connection, q, limit, prefix)
+                rows = [line[:-2] + (-line[-2], line[-1]) for line in cursor]
+        except sqlite3.Error as e:
+            return {'message': f'Database error: {str(e)}'}, 500
+        if rows:
+            body = encode_envelope('movies', rows, columns_of(cursor), message='Movie entries found.')
+            return json_response(body, 200, headers)
+        return {'message':'No movie entries found.'}, 404, headers
+
+class MovieFacets(Resource):
+    def get(self):
+        """
+        Count movies per facet value, optionally restricted by the /movies filters
+        ---
+        tags:
+          - Movies
+        parameters:
+          - in: query
+            name: facets
+            type: string
+            required: false
+            description: Comma-separated facets to count (type, rating, release_year, country, listed_in)
+          - in: query
+            name: type
+            type: string
+            required: false
+            description: Filter by type (Movie/TV Show)
+          - in: query
+            name: country
+            type: string
+            required: false
+            description: Filter by country
+          - in: query
+            name: release_year
+            type: integer
+            required: false
+            description: Filter by release year
+          - in: query
+            name: rating
+            type: string
+            required: false
+            description: Filter by rating
+          - in: query
+            name: listed_in
+            type: string
+            required: false
+            description: Filter by genre/category
+          - in: query
+            name: cast
+            type: string
+            required: false
+            description: Filter by cast member (full name or whole words of it)
+        responses:
+          200:
+            description: Counts per facet value, most frequent first. A country or listed_in value counts the titles its /movies filter returns, so Dramas also counts "TV Dramas"
+          304:
+            description: Catalog not modified since the given ETag
+          400:
+            description: Unknown facet
+          500:
+            description: Database error
+        """
+        allowed_facets = filters_json['movies']['facets']
+        facets = allowed_facets
+        if request.args.get('facets'):
+            facets = [facet.strip() for facet in request.args.get('facets').split(',') if facet.strip()]
+            unknown = [facet for facet in facets if facet not in allowed_facets]
+            if unknown:
+                return {'message': 'Unknown facet {}.'.format(', '.join(unknown))}, 400
+        filters = parse_filters()
+
+        try:
+            with pool.read() as connection:
+                version, modify_date = current_version(connection)
+                etag = make_etag(version, request.path, sorted(request.args.items(multi=True)))
+                headers = cache_headers(etag, modify_date)
+                if is_not_modified(etag, modify_date):
+                    return not_modified(headers)
+                if filters:
+                    where_clauses, values = build_where(filters)
+                    counts = filtered_facet_counts(connection, facets, where_clauses, values)
+                else:
+                    counts = facet_counts(connection, facets)
+        except sqlite3.Error as e:
+            return {'message': f'Database error: {str(e)}'}, 500
+        return {
+            'facets': counts,
+            'message': 'Facet counts found.'
+        }, 200, headers
+
 class Movie(Resource):
     def get(self, id):
         """
@@ -115,19 +741,36 @@ class Movie(Resource):
             type: string
             required: true
             description: Movie id
+          - in: query
+            name: fields
+            type: string
+            required: false
+            description: Comma-separated columns to return (id is always included)
         responses:
           200:
             description: Movie entry found
+          304:
+            description: Movie entry not modified since the given ETag
+          400:
+            description: Unknown field
           404:
             description: Movie entry not found
         """
-        movie = MovieModel.find_movie(id)
+        fields, message = parse_fields()
+        if message:
+            return {'message': message}, 400
+        version, modify_date = CatalogVersionModel.current()
+        etag = make_etag(version, request.path, fields)
+        headers = cache_headers(etag, modify_date)
+        if is_not_modified(etag, modify_date):
+            return not_modified(headers)
+        movie = MovieModel.find_movie(id, fields)
         if movie:
             return {
-                'movie': movie.json(),
+                'movie': movie.json(fields),
                 'message': 'Movie entry found.'
-            }, 200
-        return {'message':'Movie entry not found.'}, 404
+            }, 200, headers
+        return {'message':'Movie entry not found.'}, 404, headers
     
     @jwt_required()
     def post(self, id):
@@ -241,7 +884,8 @@ class Movie(Resource):
         if movie:
             data = MovieModel.parse_movie(id)
             try:
-                movie.update_movie(id,**data)
+                data.pop('id')
+                movie.update_movie(**data)
                 return {
                     'hotel': movie.json(),
                     'message': 'Movie entry successfully updated.'
@@ -283,4 +927,55 @@ class Movie(Resource):
             except Exception as e:
                 print(f"Error deleting movie entry: {e}")
                 return {'message': 'Error deleting movie entry.'}, 500
-        else: return {'message':'Movie entry not found.'}, 404
\ No newline at end of file
+        else: return {'message':'Movie entry not found.'}, 404
+
+class MovieBatch(Resource):
+    @jwt_required()
+    def post(self):
+        """
+        Insert, update and delete movie entries in one transaction
+        ---
+        tags:
+          - Movies
+        parameters:
+          - in: body
+            name: body
+            schema:
+              type: object
+              properties:
+                operations:
+                  type: array
+                  items:
+                    type: object
+                    properties:
+                      op:
+                        type: string
+                        enum: [insert, patch, delete]
+                      id:
+                        type: string
+                      movie:
+                        type: object
+        responses:
+          200:
+            description: Batch processed, see the status of each operation
+          400:
+            description: Missing or too many operations
+          500:
+            description: Error applying movie batch
+        """
+        body = request.get_json(silent=True)
+        operations = body.get('operations') if isinstance(body, dict) else body
+        if not isinstance(operations, list) or not operations:
+            return {'message': 'The field operations must be a non-empty array.'}, 400
+        max_batch_size = filters_json['movies']['max_batch_size']
+        if len(operations) > max_batch_size:
+            return {'message': 'A batch accepts at most {} operations.'.format(max_batch_size)}, 400
+        try:
+            results = MovieModel.apply_batch(operations)
+        except Exception as e:
+            print(f"Error applying movie batch: {e}")
+            return {'message': 'Error applying movie batch.'}, 500
+        return {
+            'results': results,
+            'message': 'Movie batch processed.'
+        }, 200
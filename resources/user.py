@@ -1,7 +1,10 @@
 from flask_restful import Resource
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt
-from flask import make_response, render_template
+from flask import make_response
 from models.user import UserModel
+from services.mailer import mailer
+from services.passwords import PasswordHasherBusy
+from services.templates import templates
 from blacklist import BLACKLIST
     
 class User(Resource):
@@ -103,14 +106,13 @@ class UserSignon(Resource):
         user = UserModel(**data)
         user.active = False
         try:
-            user.insert_user()
-            user.send_confirmation_email()
+            user.insert_user(send_confirmation=True)
+            mailer.notify()
             return {
                 'user': user.json(),
                 'message': 'User successfully inserted.'
             }, 201
         except Exception as e:
-            user.delete_user()
             print(f"Error inserting user: {e}")
             return {'message': 'Error inserting user.'}, 500
     
@@ -142,6 +144,8 @@ class UserSignon(Resource):
             description: User not found
           500:
             description: Error updating user
+          503:
+            description: Too many password operations in progress
         """
         data = UserModel.parse_user()
         user = UserModel.find_user_login(data['login'])
@@ -152,6 +156,8 @@ class UserSignon(Resource):
                     'user': user.json(),
                     'message': 'User successfully updated.'
                 }, 200
+            except PasswordHasherBusy:
+                raise
             except Exception as e:
                 print(f"Error updating user: {e}")
                 return {'message': 'Error updating user.'}, 500
@@ -182,11 +188,14 @@ class UserLogin(Resource):
             description: Login or password are invalid
           409:
             description: Inactive user
+          503:
+            description: Too many password operations in progress
         """
         data = UserModel.parse_user()
         user = UserModel.find_user_login(data['login'])
         if user and UserModel.check_password(data['password'],user.password):
             if user.active == True:
+                user.rehash_password(data['password'])
                 token = create_access_token(identity=user.id)
                 return {
                     'token': token
@@ -215,7 +224,7 @@ class UserLogout(Resource):
         """
         jwt = get_jwt()['jti']
         if jwt:
-            BLACKLIST.add(jwt)
+            BLACKLIST.add(jwt, get_jwt().get('exp'))
             return {'message':'User successfully logged out.'}, 200
         return {'message': 'Error logging out.'}, 500
             
@@ -224,15 +233,15 @@ class UserConfirm(Resource):
     def get(cls,id):
       user = UserModel.find_user_id(id)
       if not user:
-        response = make_response(render_template('user_notfound.html'), 404)
+        response = make_response(templates.static('user_notfound.html'), 404)
         response.headers['Content-Type'] = 'text/html'
         return response
       if user.active == False:
         user.active = True
         user.insert_user() #Na realidade faz o update
-        response = make_response(render_template('user_confirmation.html', email=user.email, usuario=user.login), 200)
+        response = make_response(templates.render('user_confirmation.html', email=user.email, usuario=user.login), 200)
         response.headers['Content-Type'] = 'text/html'
         return response
-      response = make_response(render_template('user_confirmed.html', email=user.email, usuario=user.login), 200)
+      response = make_response(templates.render('user_confirmed.html', email=user.email, usuario=user.login), 200)
       response.headers['Content-Type'] = 'text/html'
       return response
\ No newline at end of file
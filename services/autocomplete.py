@@ -0,0 +1,199 @@
+from bisect import bisect_left, insort
+from services.catalog_copy import CatalogCopy
+from services.movie_values import split_values
+from services.versioning import current_version
+from sql_pool import pool
+from conf import config as config_json
+from conf import filters as filters_json
+import heapq
+import threading
+import unicodedata
+
+FIELDS = ('title', 'director', 'cast')
+MAX_CHAR = '\U0010ffff'
+MAX_WORDS = 8
+WARM_LENGTH = 2
+CACHE_SIZE = 4096
+
+def normalize(text):
+    if text.isascii():
+        return ' '.join(text.casefold().split())
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(text.casefold().split())
+
+def prefix_keys(normalized):
+    """The normalized text and the text from each following word, so 'han' finds 'Tom Hanks'."""
+    words = normalized.split()[:MAX_WORDS]
+    return tuple(sorted({' '.join(words[position:]) for position in range(len(words))}))
+
+class PrefixField:
+    """
+    Suggestions of one field. Every prefix key is kept in a sorted list of
+    (key, slot) tuples, so the keys starting with a prefix are one bisect
+    range. The best suggestions of each prefix asked for are kept until a
+    write changes a suggestion under that prefix. The prefixes of up to
+    WARM_LENGTH characters, whose ranges are the largest, are computed up
+    front and never evicted.
+    """
+    def __init__(self, max_suggestions):
+        self.max_suggestions = max_suggestions
+        self.entries = []
+        self.slots = {}
+        self.values = []
+        self.keys = []
+        self.movies = []
+        self.ranks = []
+        self.warm = {}
+        self.cache = {}
+
+    @staticmethod
+    def rank(movies):
+        # More titles first, then the most recently added.
+        return (len(movies), max(movies.values())) if movies else None
+
+    def add(self, group, value, normalized, id, recency, bulk=False):
+        """Adds a movie to a suggestion. A bulk load calls sort() once at the end."""
+        slot = self.slots.get(group)
+        if slot is None:
+            slot = self.slots[group] = len(self.values)
+            self.values.append(value)
+            self.keys.append(prefix_keys(normalized))
+            self.movies.append({})
+            self.ranks.append(None)
+            for key in self.keys[slot]:
+                if bulk:
+                    self.entries.append((key, slot))
+                else:
+                    insort(self.entries, (key, slot))
+        self.movies[slot][id] = recency
+        if not bulk:
+            self.rerank(slot)
+
+    def sort(self):
+        self.entries.sort()
+        self.ranks = [self.rank(movies) for movies in self.movies]
+        ranked = sorted(((rank, slot) for slot, rank in enumerate(self.ranks) if rank is not None), reverse=True)
+        self.warm = {}
+        self.cache = {}
+        for _, slot in ranked:
+            for prefix in {key[:length] for key in self.keys[slot] for length in range(1, WARM_LENGTH + 1)}:
+                top = self.warm.setdefault(prefix, [])
+                if len(top) < self.max_suggestions:
+                    top.append(slot)
+
+    def remove(self, group, id):
+        slot = self.slots.get(group)
+        if slot is None:
+            return
+        self.movies[slot].pop(id, None)
+        if not self.movies[slot]:
+            del self.slots[group]
+            self.invalidate(slot)
+            for key in self.keys[slot]:
+                del self.entries[bisect_left(self.entries, (key, slot))]
+            self.keys[slot] = ()
+        self.rerank(slot)
+
+    def rerank(self, slot):
+        rank = self.rank(self.movies[slot])
+        if rank != self.ranks[slot]:
+            self.ranks[slot] = rank
+            self.invalidate(slot)
+
+    def invalidate(self, slot):
+        for key in self.keys[slot]:
+            for length in range(1, len(key) + 1):
+                (self.warm if length <= WARM_LENGTH else self.cache).pop(key[:length], None)
+
+    def search(self, prefix, limit):
+        cache = self.warm if len(prefix) <= WARM_LENGTH else self.cache
+        top = cache.get(prefix)
+        if top is None:
+            start = bisect_left(self.entries, (prefix,))
+            end = bisect_left(self.entries, (prefix + MAX_CHAR,), start)
+            slots = {slot for _, slot in self.entries[start:end]}
+            top = heapq.nlargest(self.max_suggestions, slots, key=lambda slot: (self.ranks[slot], slot))
+            if cache is self.cache and len(cache) >= CACHE_SIZE:
+                cache.clear()
+            cache[prefix] = top
+        return [(self.ranks[slot], self.values[slot], self.movies[slot]) for slot in top[:limit]]
+
+class AutocompleteIndex(CatalogCopy):
+    """
+    In-process prefix index of titles, directors and cast names for typeahead.
+    Titles are one suggestion per movie ranked by recency; people are one
+    suggestion per name ranked by their number of titles, then recency.
+    """
+    select_columns = 'id, title, director, "cast", date_added, release_year'
+
+    def __init__(self, pool, table, max_suggestions):
+        super().__init__(pool, table)
+        self.configure(max_suggestions)
+
+    def configure(self, max_suggestions):
+        with self.lock:
+            self.max_suggestions = max_suggestions
+            self.loaded = False
+            self.version = None
+            self.reset()
+
+    def reset(self):
+        self.fields = {field: PrefixField(self.max_suggestions) for field in FIELDS}
+        self.contributions = {}
+
+    def load(self):
+        with self.lock:
+            self.reset()
+            with self.pool.read() as connection:
+                self.version = current_version(connection)[0]
+                for row in connection.execute(f"SELECT {self.select_columns} FROM {self.table}"):
+                    self._add(row, bulk=True)
+            for field in self.fields.values():
+                field.sort()
+            self.loaded = True
+
+    def start(self):
+        """Loads the index in a background thread, so the worker starts serving right away."""
+        threading.Thread(target=self.ensure_loaded, name='autocomplete-load', daemon=True).start()
+
+    def _add(self, row, bulk=False):
+        id, title, director, cast, date_added, release_year = row
+        # One string keeps the per-movie dicts out of the garbage collector's way.
+        recency = f"{date_added or ''}|{release_year or 0:04d}"
+        contributions = []
+        if title:
+            contributions.append(('title', id, title, normalize(title)))
+        for field, names in (('director', director), ('cast', cast)):
+            for name in split_values(names):
+                normalized = normalize(name)
+                contributions.append((field, normalized, name, normalized))
+        for field, group, value, normalized in contributions:
+            self.fields[field].add(group, value, normalized, id, recency, bulk)
+        self.contributions[id] = [(field, group) for field, group, _, _ in contributions]
+
+    def _remove(self, id):
+        for field, group in self.contributions.pop(id, []):
+            self.fields[field].remove(group, id)
+
+    def suggest(self, prefix, fields=FIELDS, limit=10):
+        """Best suggestions for the prefix as dicts, best first."""
+        prefix = normalize(prefix)
+        with self.lock:
+            results = []
+            for field in fields:
+                for rank, value, movies in self.fields[field].search(prefix, limit):
+                    results.append((rank, field, value, movies))
+            results = heapq.nlargest(limit, results, key=lambda result: result[0]) if len(fields) > 1 else results
+            suggestions = []
+            for rank, field, value, movies in results:
+                suggestion = {'value': value, 'field': field, 'count': len(movies)}
+                if field == 'title':
+                    suggestion['id'] = next(iter(movies))
+                suggestions.append(suggestion)
+            return suggestions
+
+def autocomplete_options(config):
+    return config['AUTOCOMPLETE_MAX_LIMIT'],
+
+autocomplete = AutocompleteIndex(pool, filters_json['movies']['table'], *autocomplete_options(config_json))
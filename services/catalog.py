@@ -0,0 +1,163 @@
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from services.catalog_copy import CatalogCopy
+from services.movie_values import value_terms
+from services.versioning import current_version
+from sql_pool import pool
+from conf import filters as filters_json
+
+class CatalogIndex(CatalogCopy):
+    """
+    In-process copy of the movie table with one sorted posting list (array of
+    row slots) per filter value, so equality filters are answered by
+    intersecting posting lists instead of scanning the table. Slots follow
+    the id order, so a posting list is also in id order; a write that
+    breaks this renumbers the slots as it is applied.
+    """
+    def __init__(self, pool, table, filters, multivalued=()):
+        super().__init__(pool, table)
+        self.filters = list(filters)
+        self.multivalued = set(multivalued)
+        self.reset()
+
+    def reset(self):
+        self.columns = []
+        self.positions = {}
+        self.rows = []
+        self.slots = {}
+        self.order = []
+        self.in_order = True
+        self.postings = {key: {} for key in self.filters}
+
+    @staticmethod
+    def normalize(value):
+        if value is None:
+            return None
+        return str(value).upper()
+
+    def values(self, key, value):
+        if key in self.multivalued:
+            return [term.upper() for term in value_terms(value)]
+        if value is None:
+            return []
+        return [self.normalize(value)]
+
+    def load(self):
+        with self.lock:
+            self.reset()
+            with self.pool.read() as connection:
+                self.version = current_version(connection)[0]
+                cursor = connection.execute(f"SELECT * FROM {self.table} ORDER BY id")
+                self.columns = [column[0] for column in cursor.description]
+                self.positions = {key: self.columns.index(key) for key in self.filters}
+                for row in cursor:
+                    self._add(row)
+            self.loaded = True
+
+    def _add(self, row, slot=None):
+        """Adds a row in a new slot, or in the freed slot of the same id, which keeps its place in id order."""
+        id = row[0]
+        reused = slot is not None
+        if reused:
+            self.rows[slot] = row
+        else:
+            slot = len(self.rows)
+            self.rows.append(row)
+        self.slots[id] = slot
+        if self.order and id < self.order[-1]:
+            self.in_order = self.in_order and reused
+            self.order.insert(bisect_left(self.order, id), id)
+        else:
+            self.order.append(id)
+        for key, position in self.positions.items():
+            for value in self.values(key, row[position]):
+                posting = self.postings[key].setdefault(value, array('I'))
+                if reused:
+                    insort(posting, slot)
+                else:
+                    posting.append(slot)
+
+    def _remove(self, id):
+        slot = self.slots.pop(id, None)
+        if slot is None:
+            return
+        row = self.rows[slot]
+        self.rows[slot] = None
+        del self.order[bisect_left(self.order, id)]
+        for key, position in self.positions.items():
+            for value in self.values(key, row[position]):
+                posting = self.postings[key][value]
+                del posting[bisect_left(posting, slot)]
+                if not posting:
+                    del self.postings[key][value]
+
+    def apply(self, ids, rows):
+        # A rewritten movie keeps its slot; only a new id below the largest
+        # one needs the slots renumbered.
+        with self.lock:
+            freed = {id: self.slots[id] for id in ids if id in self.slots}
+            for id in ids:
+                self._remove(id)
+            for row in rows:
+                self._add(row, freed.get(row[0]))
+            if not self.in_order:
+                self.reorder()
+
+    def reorder(self):
+        """Renumbers the slots in id order, dropping the ones of deleted movies."""
+        old_slots = [self.slots[id] for id in self.order]
+        renumbered = [None] * len(self.rows)
+        for slot, old_slot in enumerate(old_slots):
+            renumbered[old_slot] = slot
+        self.rows = [self.rows[slot] for slot in old_slots]
+        self.slots = {id: slot for slot, id in enumerate(self.order)}
+        for postings in self.postings.values():
+            for value, posting in postings.items():
+                postings[value] = array('I', sorted(renumbered[slot] for slot in posting))
+        self.in_order = True
+
+    def match(self, filters, start_slot=0, limit=None):
+        postings = []
+        for key, value in filters.items():
+            if key in self.multivalued:
+                value = ' '.join(value.split())
+            posting = self.postings[key].get(self.normalize(value))
+            if posting is None:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+        smallest, others = postings[0], postings[1:]
+        slots = []
+        for index in range(bisect_left(smallest, start_slot), len(smallest)):
+            slot = smallest[index]
+            for posting in others:
+                position = bisect_left(posting, slot)
+                if position == len(posting) or posting[position] != slot:
+                    break
+            else:
+                slots.append(slot)
+                if limit is not None and len(slots) == limit:
+                    break
+        return slots
+
+    def query(self, filters, after=None, limit=None, with_total=False):
+        self.ensure_loaded()
+        with self.lock:
+            total = None
+            start = bisect_right(self.order, after) if after is not None else 0
+            if not filters:
+                ids = self.order[start:] if limit is None else self.order[start:start + limit]
+                if with_total:
+                    total = len(self.order)
+                return [self.rows[self.slots[id]] for id in ids], total
+            if with_total:
+                total = len(self.match(filters))
+            if start == len(self.order):
+                return [], total
+            slots = self.match(filters, self.slots[self.order[start]], limit)
+            return [self.rows[slot] for slot in slots], total
+
+catalog = CatalogIndex(pool,
+                       filters_json['movies']['table'],
+                       filters_json['movies']['filters'],
+                       filters_json['movies']['multivalued'])
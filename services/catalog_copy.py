@@ -0,0 +1,88 @@
+from services.versioning import current_version
+import threading
+
+CHUNK_IDS = 500
+REFRESH_RELOAD_THRESHOLD = 1000
+
+def id_chunks(ids):
+    """The ids as text, in chunks below SQLite's bound parameter limit, with their placeholders."""
+    ids = [str(id) for id in ids]
+    for start in range(0, len(ids), CHUNK_IDS):
+        chunk = ids[start:start + CHUNK_IDS]
+        yield chunk, ', '.join('?' for _ in chunk)
+
+def rows_by_ids(connection, table, columns, ids):
+    rows = []
+    for chunk, placeholders in id_chunks(ids):
+        rows += connection.execute(f"SELECT {columns} FROM {table} WHERE id IN ({placeholders})", chunk).fetchall()
+    return rows
+
+class CatalogCopy:
+    """
+    Base of the structures derived from the movie table outside SQLite: the
+    memory engine, the similarity index and the autocomplete index. version
+    is the catalog version the copy reflects, None when it is unknown. A
+    write re-reads only the movies it touched; a reader that sees another
+    version reloads the whole copy.
+    """
+    select_columns = '*'
+    loaded = False
+    version = None
+
+    def __init__(self, pool, table):
+        self.pool = pool
+        self.table = table
+        self.lock = threading.RLock()
+
+    def load(self):
+        raise NotImplementedError
+
+    def apply(self, ids, rows):
+        """Replaces the given ids by the rows read back for them; deleted ids have no row."""
+        for id in ids:
+            self._remove(id)
+        for row in rows:
+            self._add(row)
+
+    def ensure_loaded(self):
+        with self.lock:
+            if not self.loaded:
+                self.load()
+
+    def is_current(self, version):
+        return self.loaded and self.version == version
+
+    def reload(self, version):
+        self.load()
+
+    def sync(self, version):
+        """Reloads when the catalog changed since the last load, e.g. in another process."""
+        with self.lock:
+            if not self.is_current(version):
+                self.reload(version)
+
+    def refresh(self, *ids):
+        """Applies the given movies after they were written."""
+        with self.lock:
+            if not self.loaded:
+                return
+            if len(ids) > REFRESH_RELOAD_THRESHOLD:
+                self.load()
+                return
+            with self.pool.read() as connection:
+                rows = rows_by_ids(connection, self.table, self.select_columns, ids)
+                version = current_version(connection)[0]
+            self.apply([str(id) for id in ids], rows)
+            self.advance(version)
+
+    def invalidate(self):
+        """Marks the copy stale after a failed refresh, so the next sync reloads it."""
+        with self.lock:
+            self.version = None
+
+    def advance(self, version):
+        # The write moved the catalog by exactly one version, unless apply just
+        # reloaded; anything else means another writer got in between and the
+        # next sync must reload.
+        if self.version != version:
+            self.version = version if self.version is not None and version == self.version + 1 else None
@@ -0,0 +1,177 @@
+from collections import OrderedDict
+from flask import request
+from werkzeug.http import quote_etag, unquote_etag
+from conf import config as config_json
+import threading
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_TYPES = {'application/json', 'application/x-ndjson', 'application/javascript', 'application/xml'}
+
+class GzipCodec:
+    name = 'gzip'
+
+    def __init__(self, level):
+        self.level = level
+
+    def compress(self, data):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        return compressor.compress(data) + compressor.flush()
+
+    def stream(self, chunks):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+
+class BrotliCodec:
+    name = 'br'
+
+    def __init__(self, level):
+        self.level = level
+
+    def compress(self, data):
+        return brotli.compress(data, quality=self.level)
+
+    def stream(self, chunks):
+        compressor = brotli.Compressor(quality=self.level)
+        for chunk in chunks:
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+
+class ZstdCodec:
+    name = 'zstd'
+
+    def __init__(self, level):
+        self.level = level
+
+    def compress(self, data):
+        return zstandard.ZstdCompressor(level=self.level).compress(data)
+
+    def stream(self, chunks):
+        compressor = zstandard.ZstdCompressor(level=self.level).compressobj()
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+            if data:
+                yield data
+        yield compressor.flush()
+
+def available_codecs(levels):
+    codecs = []
+    if zstandard is not None:
+        codecs.append(ZstdCodec(levels['zstd']))
+    if brotli is not None:
+        codecs.append(BrotliCodec(levels['br']))
+    codecs.append(GzipCodec(levels['gzip']))
+    return codecs
+
+def encode_chunks(chunks):
+    for chunk in chunks:
+        yield chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+
+class ResponseCompressor:
+    """
+    after_request hook that compresses JSON and NDJSON responses with the best
+    encoding the client accepts (zstd, br, gzip, whichever are installed).
+    Bodies below min_size are sent as is. Compressed bodies of responses that
+    carry an ETag are kept in an LRU cache of up to cache_bytes, so repeated
+    requests for an unchanged catalog version are not compressed again.
+    Streamed responses are compressed chunk by chunk.
+    """
+    def __init__(self, min_size, levels, cache_bytes):
+        self.lock = threading.Lock()
+        self.configure(min_size, levels, cache_bytes)
+
+    def configure(self, min_size, levels, cache_bytes):
+        with self.lock:
+            self.min_size = min_size
+            self.codecs = {codec.name: codec for codec in available_codecs(levels)}
+            self.cache_bytes = cache_bytes
+            self.cache = OrderedDict()
+            self.cached_bytes = 0
+
+    def compressible(self, response):
+        if response.status_code != 200 or response.direct_passthrough:
+            return False
+        if 'Content-Encoding' in response.headers:
+            return False
+        mimetype = response.mimetype or ''
+        return mimetype in COMPRESSIBLE_TYPES or mimetype.startswith('text/')
+
+    def negotiate(self):
+        return request.accept_encodings.best_match(list(self.codecs))
+
+    def cached(self, key):
+        with self.lock:
+            body = self.cache.get(key)
+            if body is not None:
+                self.cache.move_to_end(key)
+            return body
+
+    def remember(self, key, body):
+        if len(body) > self.cache_bytes:
+            return
+        with self.lock:
+            if key in self.cache:
+                return
+            self.cache[key] = body
+            self.cached_bytes += len(body)
+            while self.cached_bytes > self.cache_bytes:
+                self.cached_bytes -= len(self.cache.popitem(last=False)[1])
+
+    def __call__(self, response):
+        if response.status_code == 304 and 'ETag' in response.headers and self.negotiate():
+            response.vary.add('Accept-Encoding')
+            self.weaken_etag(response)
+            return response
+        if not self.compressible(response):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = self.negotiate()
+        if encoding is None:
+            return response
+        codec = self.codecs[encoding]
+        etag = response.headers.get('ETag')
+        if response.is_streamed:
+            response.response = codec.stream(encode_chunks(response.response))
+            response.headers.pop('Content-Length', None)
+        else:
+            key = (etag, encoding)
+            body = self.cached(key) if etag else None
+            if body is None:
+                data = response.get_data()
+                if len(data) < self.min_size:
+                    return response
+                body = codec.compress(data)
+                if etag:
+                    self.remember(key, body)
+            response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        if etag:
+            self.weaken_etag(response)
+        return response
+
+    @staticmethod
+    def weaken_etag(response):
+        # A compressed body is a different representation of the same
+        # catalog version, so its validator is weak.
+        value, weak = unquote_etag(response.headers['ETag'])
+        response.headers['ETag'] = quote_etag(value, weak=True)
+
+def compression_options(config):
+    return config['COMPRESSION_MIN_SIZE'], config['COMPRESSION_LEVELS'], config['COMPRESSION_CACHE_BYTES']
+
+compressor = ResponseCompressor(*compression_options(config_json))
@@ -0,0 +1,34 @@
+from services.versioning import bump_version
+from conf import filters as filters_json
+from datetime import datetime
+
+TABLE = filters_json['movies']['table']
+DATE_FORMATS = ('%Y-%m-%d', '%B %d, %Y', '%b %d, %Y', '%d-%b-%y')
+ISO_DATE = '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'
+
+def parse_date(value):
+    """ISO text (YYYY-MM-DD) of a date written in one of DATE_FORMATS, None if it is not a date."""
+    if not isinstance(value, str):
+        return None
+    value = ' '.join(value.split())
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+def ensure_iso_dates(connection):
+    """
+    Rewrites the date_added values that are not ISO dates, left by loads made
+    before the loader converted them, so range filters and sorting compare
+    dates. Values that are not dates become NULL. Returns the rows changed.
+    """
+    connection.create_function('iso_date', 1, parse_date, deterministic=True)
+    cursor = connection.execute(f"""
+        UPDATE {TABLE} SET date_added = iso_date(date_added)
+        WHERE date_added IS NOT NULL AND date_added NOT GLOB '{ISO_DATE}'
+    """)
+    if cursor.rowcount:
+        bump_version(connection)
+    return cursor.rowcount
@@ -0,0 +1,38 @@
+from services.versioning import bump_version
+from conf import filters as filters_json
+import re
+
+TABLE = filters_json['movies']['table']
+DURATION_COLUMNS = {'duration_minutes': 'INTEGER', 'seasons': 'INTEGER'}
+DURATION_PATTERN = re.compile(r'^\s*(\d+)\s*(min|season)', re.IGNORECASE)
+
+def parse_duration(value):
+    """(duration_minutes, seasons) of a duration text like "90 min" or "2 Seasons"."""
+    match = DURATION_PATTERN.match(value) if isinstance(value, str) else None
+    if match is None:
+        return None, None
+    number = int(match.group(1))
+    if match.group(2).lower() == 'min':
+        return number, None
+    return None, number
+
+def ensure_duration_columns(connection):
+    """
+    Adds duration_minutes and seasons to databases created before them and
+    fills them from duration for the rows that still miss both. Returns the
+    rows changed.
+    """
+    existing = {row[1] for row in connection.execute(f"PRAGMA table_info({TABLE})")}
+    for column, column_type in DURATION_COLUMNS.items():
+        if column not in existing:
+            connection.execute(f'ALTER TABLE {TABLE} ADD COLUMN "{column}" {column_type}')
+    connection.create_function('duration_minutes', 1, lambda value: parse_duration(value)[0], deterministic=True)
+    connection.create_function('duration_seasons', 1, lambda value: parse_duration(value)[1], deterministic=True)
+    cursor = connection.execute(f"""
+        UPDATE {TABLE} SET duration_minutes = duration_minutes(duration), seasons = duration_seasons(duration)
+        WHERE duration IS NOT NULL AND duration_minutes IS NULL AND seasons IS NULL
+          AND (duration_minutes(duration) IS NOT NULL OR duration_seasons(duration) IS NOT NULL)
+    """)
+    if cursor.rowcount:
+        bump_version(connection)
+    return cursor.rowcount
@@ -0,0 +1,143 @@
+from conf import config as config_json
+from conf import filters as filters_json
+
+TABLE = filters_json['movies']['table']
+MULTIVALUED = filters_json['movies']['multivalued']
+TERMS_TABLE = filters_json['movies']['terms']
+FACETS = filters_json['movies']['facets']
+FACET_TABLE = config_json['SQLALCHEMY_MOVIE_FACET_TABLE']
+
+def value_counts(facet):
+    """
+    Values of a multivalued facet with the movies their filter matches. The
+    values are the whole elements of the join table; a movie counts when the
+    value is one of its elements or a run of whole words in one, as in the
+    /movies filter, so listed_in=Dramas also counts "TV Dramas".
+    """
+    return f"""
+        SELECT value.name, COUNT(*) AS count
+        FROM (SELECT name FROM {MULTIVALUED[facet]} GROUP BY name COLLATE NOCASE) AS value
+        JOIN {TERMS_TABLE} AS term ON term.field = '{facet}' AND term.term = value.name"""
+
+def increment(facet, value):
+    return f"""
+        INSERT INTO {FACET_TABLE} (facet, value, count) SELECT '{facet}', {value}, 1 WHERE {value} IS NOT NULL
+        ON CONFLICT(facet, value) DO UPDATE SET count = count + 1;"""
+
+def decrement(facet, value):
+    return f"""
+        UPDATE {FACET_TABLE} SET count = count - 1 WHERE facet = '{facet}' AND value = {value};
+        DELETE FROM {FACET_TABLE} WHERE facet = '{facet}' AND value = {value} AND count <= 0;"""
+
+def facet_triggers():
+    triggers = {}
+    scalar = [facet for facet in FACETS if facet not in MULTIVALUED]
+    columns = ', '.join(f'"{facet}"' for facet in scalar)
+    triggers[f"{FACET_TABLE}_{TABLE}_ai"] = f"AFTER INSERT ON {TABLE} BEGIN" + \
+        ''.join(increment(facet, f'new."{facet}"') for facet in scalar)
+    triggers[f"{FACET_TABLE}_{TABLE}_ad"] = f"AFTER DELETE ON {TABLE} BEGIN" + \
+        ''.join(decrement(facet, f'old."{facet}"') for facet in scalar)
+    triggers[f"{FACET_TABLE}_{TABLE}_au"] = f"AFTER UPDATE OF {columns} ON {TABLE} BEGIN" + \
+        ''.join(decrement(facet, f'old."{facet}"') + increment(facet, f'new."{facet}"') for facet in scalar)
+    multivalued = [facet for facet in FACETS if facet in MULTIVALUED]
+    if not multivalued:
+        return triggers
+    # A term row moves the count of the value it matches, if that value is an
+    # element of some movie. The first element with a value adds it, counting
+    # the terms already stored; the last one removes it.
+    fields = ', '.join(f"'{facet}'" for facet in multivalued)
+    triggers[f"{FACET_TABLE}_{TERMS_TABLE}_ai"] = f"AFTER INSERT ON {TERMS_TABLE} WHEN new.field IN ({fields}) BEGIN" + f"""
+        UPDATE {FACET_TABLE} SET count = count + 1 WHERE facet = new.field AND value = new.term;"""
+    triggers[f"{FACET_TABLE}_{TERMS_TABLE}_ad"] = f"AFTER DELETE ON {TERMS_TABLE} WHEN old.field IN ({fields}) BEGIN" + f"""
+        UPDATE {FACET_TABLE} SET count = count - 1 WHERE facet = old.field AND value = old.term;
+        DELETE FROM {FACET_TABLE} WHERE facet = old.field AND value = old.term AND count <= 0;"""
+    for facet in multivalued:
+        table = MULTIVALUED[facet]
+        triggers[f"{FACET_TABLE}_{table}_ai"] = f"AFTER INSERT ON {table} BEGIN" + f"""
+        INSERT INTO {FACET_TABLE} (facet, value, count)
+        SELECT '{facet}', new.name, COUNT(*) FROM {TERMS_TABLE} WHERE field = '{facet}' AND term = new.name
+        ON CONFLICT(facet, value) DO NOTHING;"""
+        triggers[f"{FACET_TABLE}_{table}_ad"] = f"AFTER DELETE ON {table} BEGIN" + f"""
+        DELETE FROM {FACET_TABLE} WHERE facet = '{facet}' AND value = old.name
+            AND NOT EXISTS (SELECT 1 FROM {table} WHERE name = old.name);"""
+    return triggers
+
+def ensure_facet_table(connection):
+    # value compares like the NOCASE join tables, so the trigger upserts and
+    # a rebuild group "Dramas" and "dramas" the same way. Tables created
+    # before that are recreated and counted again.
+    row = connection.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (FACET_TABLE,)).fetchone()
+    if row and 'NOCASE' in row[0].upper():
+        return
+    connection.execute(f"DROP TABLE IF EXISTS {FACET_TABLE}")
+    connection.execute(f"""
+        CREATE TABLE {FACET_TABLE} (
+            facet VARCHAR(20) NOT NULL,
+            value VARCHAR(200) COLLATE NOCASE NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (facet, value))
+    """)
+
+def ensure_facet_counts(connection):
+    ensure_facet_table(connection)
+    # A trigger whose definition changed counts differently, so it is
+    # replaced and the counts are rebuilt.
+    stale = False
+    for name, body in facet_triggers().items():
+        statement = f"CREATE TRIGGER {name} {body}\nEND"
+        row = connection.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?", (name,)).fetchone()
+        if row and row[0] == statement:
+            continue
+        if row:
+            connection.execute(f"DROP TRIGGER {name}")
+            stale = True
+        connection.execute(statement)
+    if not stale and connection.execute(f"SELECT 1 FROM {FACET_TABLE} LIMIT 1").fetchone():
+        return
+    if connection.execute(f"SELECT 1 FROM {TABLE} LIMIT 1").fetchone():
+        rebuild_facet_counts(connection)
+
+def drop_facet_triggers(connection):
+    for name in facet_triggers():
+        connection.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+def rebuild_facet_counts(connection):
+    connection.execute(f"DELETE FROM {FACET_TABLE}")
+    for facet in FACETS:
+        if facet in MULTIVALUED:
+            query = value_counts(facet) + " GROUP BY value.name COLLATE NOCASE"
+        else:
+            query = f"""
+                SELECT "{facet}", COUNT(*) FROM {TABLE} WHERE "{facet}" IS NOT NULL
+                GROUP BY "{facet}" COLLATE NOCASE"""
+        connection.execute(f"INSERT INTO {FACET_TABLE} (facet, value, count) SELECT '{facet}', * FROM ({query})")
+
+def facet_counts(connection, facets):
+    counts = {facet: [] for facet in facets}
+    placeholders = ', '.join('?' for _ in facets)
+    rows = connection.execute(f"""
+        SELECT facet, value, count FROM {FACET_TABLE}
+        WHERE facet IN ({placeholders}) ORDER BY facet, count DESC, value
+    """, list(facets))
+    for facet, value, count in rows:
+        counts[facet].append({'value': value, 'count': count})
+    return counts
+
+def filtered_facet_counts(connection, facets, where_clauses, values):
+    counts = {}
+    where = " WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+    for facet in facets:
+        if facet in MULTIVALUED:
+            query = value_counts(facet) + f"""
+                WHERE term.movie_id IN (SELECT id FROM {TABLE}{where})
+                GROUP BY value.name COLLATE NOCASE ORDER BY count DESC, value.name
+            """
+        else:
+            query = f"""
+                SELECT "{facet}", COUNT(*) AS count FROM {TABLE}
+                WHERE "{facet}" IS NOT NULL AND id IN (SELECT id FROM {TABLE}{where})
+                GROUP BY "{facet}" COLLATE NOCASE ORDER BY count DESC, "{facet}"
+            """
+        rows = connection.execute(query, values)
+        counts[facet] = [{'value': str(value), 'count': count} for value, count in rows]
+    return counts
@@ -0,0 +1,74 @@
+from conf import filters as filters_json
+import hashlib
+import json
+
+TABLE = filters_json['movies']['table']
+META_TABLE = f"{TABLE}_meta"
+INDEX_PREFIX = f"ix_{TABLE}_filter_"
+INDEX_LAYOUT = 1
+TEXT_TYPES = ('CHAR', 'TEXT', 'CLOB')
+
+def configured_indexes(movies=None):
+    """
+    Column lists to index: one per scalar filter, range and sortable column
+    plus the composite indexes of database/filters.json. Multivalued filters
+    are answered by the indexes of their join tables.
+    """
+    movies = movies or filters_json['movies']
+    multivalued = movies.get('multivalued', {})
+    keys = list(movies['filters']) + list(movies.get('ranges', {})) + list(movies.get('sortable', []))
+    indexes = []
+    for columns in [[key] for key in keys] + movies.get('indexes', []):
+        columns = [column for column in columns if column not in multivalued]
+        if columns and columns not in indexes:
+            indexes.append(columns)
+    return indexes
+
+def index_name(columns):
+    return INDEX_PREFIX + '_'.join(columns)
+
+def column_types(connection):
+    return {row[1]: (row[2] or '').upper() for row in connection.execute(f"PRAGMA table_info({TABLE})")}
+
+def is_text(column_type):
+    return any(text_type in column_type for text_type in TEXT_TYPES)
+
+def index_definition(columns, types):
+    # Text filters and sorts compare with COLLATE NOCASE, so their index uses
+    # the same collation. id closes every index so keyset pages need no sort.
+    parts = [f'"{column}" COLLATE NOCASE' if is_text(types.get(column, '')) else f'"{column}"'
+             for column in columns]
+    return f"CREATE INDEX IF NOT EXISTS {index_name(columns)} ON {TABLE} ({', '.join(parts)}, id)"
+
+def index_digest(indexes):
+    layout = json.dumps({'table': TABLE, 'indexes': indexes, 'layout': INDEX_LAYOUT}, sort_keys=True)
+    return hashlib.sha1(layout.encode('utf-8')).hexdigest()
+
+def ensure_filter_indexes(connection, force=False):
+    """
+    Creates the filter indexes and drops the ones no longer configured. The
+    layout is hashed into the meta table, so this only touches the schema
+    when database/filters.json changed.
+    """
+    connection.execute(f"CREATE TABLE IF NOT EXISTS {META_TABLE} (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+    indexes = configured_indexes()
+    digest = index_digest(indexes)
+    row = connection.execute(f"SELECT value FROM {META_TABLE} WHERE key = 'filter_indexes'").fetchone()
+    if row is not None and row[0] == digest and not force:
+        return False
+    types = column_types(connection)
+    wanted = {index_name(columns) for columns in indexes}
+    existing = [name for (name,) in connection.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? COLLATE NOCASE", (TABLE,))
+        if name.startswith(INDEX_PREFIX)]
+    for name in existing:
+        if name not in wanted:
+            connection.execute(f"DROP INDEX IF EXISTS {name}")
+    for columns in indexes:
+        connection.execute(index_definition(columns, types))
+    connection.execute(f"ANALYZE {TABLE}")
+    connection.execute(f"""
+        INSERT INTO {META_TABLE} (key, value) VALUES ('filter_indexes', ?)
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value
+    """, (digest,))
+    return True
@@ -0,0 +1,162 @@
+from datetime import timedelta
+from services.metrics import email_duration
+from services.versioning import utcnow
+from sql_pool import pool
+from conf import config as config_json
+import random
+import threading
+import time
+
+OUTBOX_TABLE = config_json['SQLALCHEMY_EMAIL_OUTBOX_TABLE']
+RETRY_STATUS = {408, 425, 429}
+
+def timestamp(value):
+    # Same text layout SQLAlchemy uses for DateTime columns on SQLite, so the
+    # values compare correctly as strings.
+    return value.strftime('%Y-%m-%d %H:%M:%S.%f')
+
+class DeliveryError(Exception):
+    def __init__(self, message, permanent=False):
+        super().__init__(message)
+        self.permanent = permanent
+
+class MailDeliveryWorker:
+    """
+    Background thread that drains the email outbox. Messages are claimed in
+    batches with a lease (so several worker processes never send the same
+    message twice), posted through one keep-alive HTTP session and marked as
+    sent, or rescheduled with exponential backoff until max_attempts.
+    """
+    def __init__(self, pool, url, api_key, sender, batch_size, timeout, max_attempts,
+                 backoff_base, backoff_max, lease, poll_interval, enabled=True):
+        self.pool = pool
+        self.thread = None
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.configure(url, api_key, sender, batch_size, timeout, max_attempts,
+                       backoff_base, backoff_max, lease, poll_interval, enabled)
+
+    def configure(self, url, api_key, sender, batch_size, timeout, max_attempts,
+                  backoff_base, backoff_max, lease, poll_interval, enabled=True):
+        """Takes effect from the next batch; start() is still needed to run the thread."""
+        with self.lock:
+            self.url = url
+            self.api_key = api_key
+            self.sender = sender
+            self.batch_size = batch_size
+            self.timeout = timeout
+            self.max_attempts = max_attempts
+            self.backoff_base = backoff_base
+            self.backoff_max = backoff_max
+            self.lease = lease
+            self.poll_interval = poll_interval
+            self.enabled = enabled
+            self.session = None
+
+    def start(self):
+        with self.lock:
+            if not self.enabled or (self.thread is not None and self.thread.is_alive()):
+                return
+            self.stopping.clear()
+            self.thread = threading.Thread(target=self.run, name='mail-delivery', daemon=True)
+            self.thread.start()
+
+    def stop(self, timeout=None):
+        self.stopping.set()
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+
+    def notify(self):
+        self.wakeup.set()
+
+    def run(self):
+        while not self.stopping.is_set():
+            try:
+                while self.drain() == self.batch_size and not self.stopping.is_set():
+                    pass
+            except Exception as e:
+                print(f"Error delivering emails: {e}")
+            self.wakeup.wait(self.poll_interval)
+            self.wakeup.clear()
+
+    def claim(self):
+        now = utcnow()
+        with self.pool.write() as connection:
+            return connection.execute(f"""
+                UPDATE {OUTBOX_TABLE} SET status = 'sending', attempts = attempts + 1, next_attempt_date = ?
+                WHERE id IN (
+                    SELECT id FROM {OUTBOX_TABLE}
+                    WHERE status IN ('pending', 'sending') AND next_attempt_date <= ?
+                    ORDER BY next_attempt_date LIMIT ?)
+                RETURNING id, recipient, subject, html, attempts
+            """, (timestamp(now + timedelta(seconds=self.lease)), timestamp(now), self.batch_size)).fetchall()
+
+    def send(self, recipient, subject, html):
+        import requests
+        if self.session is None:
+            self.session = requests.Session()
+        start = time.perf_counter()
+        try:
+            response = self.session.post(
+                self.url,
+                auth=("api", self.api_key),
+                data={"from": self.sender,
+                      "to": f"<{recipient}>",
+                      "subject": subject,
+                      "html": html},
+                timeout=self.timeout)
+        except requests.RequestException as e:
+            email_duration.observe(time.perf_counter() - start, 'error')
+            raise DeliveryError(str(e))
+        email_duration.observe(time.perf_counter() - start, str(response.status_code))
+        if response.status_code >= 400:
+            permanent = response.status_code < 500 and response.status_code not in RETRY_STATUS
+            raise DeliveryError(f"HTTP {response.status_code}: {response.text[:200]}", permanent)
+
+    def backoff(self, attempts):
+        delay = min(self.backoff_base * 2 ** (attempts - 1), self.backoff_max)
+        return delay * random.uniform(0.5, 1.0)
+
+    def drain(self):
+        """Sends one batch of due messages and returns how many were claimed."""
+        messages = self.claim()
+        if not messages:
+            return 0
+        sent, retries, failed = [], [], []
+        for id, recipient, subject, html, attempts in messages:
+            try:
+                self.send(recipient, subject, html)
+                sent.append((timestamp(utcnow()), id))
+            except DeliveryError as e:
+                error = str(e)[:500]
+                if e.permanent or attempts >= self.max_attempts:
+                    failed.append((error, id))
+                else:
+                    retry_date = utcnow() + timedelta(seconds=self.backoff(attempts))
+                    retries.append((error, timestamp(retry_date), id))
+        with self.pool.write() as connection:
+            connection.executemany(
+                f"UPDATE {OUTBOX_TABLE} SET status = 'sent', sent_date = ?, last_error = NULL WHERE id = ?", sent)
+            connection.executemany(
+                f"UPDATE {OUTBOX_TABLE} SET status = 'pending', last_error = ?, next_attempt_date = ? WHERE id = ?", retries)
+            connection.executemany(
+                f"UPDATE {OUTBOX_TABLE} SET status = 'failed', last_error = ? WHERE id = ?", failed)
+        return len(messages)
+
+def mailer_options(config):
+    return (config['EMAIL_API_URL'],
+            config['EMAIL_API_KEY'],
+            config['EMAIL_FROM'],
+            config['EMAIL_BATCH_SIZE'],
+            config['EMAIL_TIMEOUT'],
+            config['EMAIL_MAX_ATTEMPTS'],
+            config['EMAIL_BACKOFF_BASE'],
+            config['EMAIL_BACKOFF_MAX'],
+            config['EMAIL_LEASE'],
+            config['EMAIL_POLL_INTERVAL'],
+            config['EMAIL_WORKER_ENABLED'])
+
+mailer = MailDeliveryWorker(pool, *mailer_options(config_json))
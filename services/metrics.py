@@ -0,0 +1,209 @@
+from bisect import bisect_left
+from flask import Response, g, got_request_exception, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from conf import config as config_json
+from contextlib import contextmanager
+import logging
+import sqlite3
+import threading
+import time
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+slow_query_log = logging.getLogger('api.slow_query')
+thresholds = {'slow_query_ms': config_json['SLOW_QUERY_MS']}
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in pairs) + '}'
+
+def format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            values = dict(self.values)
+        for labels, value in sorted(values.items()):
+            yield f"{self.name}{format_labels(self.labels, labels)} {format_number(value)}"
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.values.get(labels)
+            if series is None:
+                series = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def samples(self):
+        with self.lock:
+            values = {labels: ([*series[0]], series[1], series[2]) for labels, series in self.values.items()}
+        for labels, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket
+                yield f"{self.name}_bucket{format_labels(self.labels, labels, [('le', format_number(bound))])} {cumulative}"
+            yield f"{self.name}_sum{format_labels(self.labels, labels)} {format_number(total)}"
+            yield f"{self.name}_count{format_labels(self.labels, labels)} {count}"
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+registry = Registry()
+request_duration = registry.register(Histogram(
+    'http_request_duration_seconds', 'Time to build the response, by route.', ('method', 'endpoint', 'status')))
+request_exceptions = registry.register(Counter(
+    'http_request_exceptions_total', 'Unhandled exceptions raised by request handlers.', ('endpoint', 'exception')))
+query_duration = registry.register(Histogram(
+    'db_query_duration_seconds', 'Time spent executing SQL statements.', ('source',)))
+queries_per_request = registry.register(Histogram(
+    'db_queries_per_request', 'SQL statements executed while handling one request.', ('endpoint',), COUNT_BUCKETS))
+slow_queries = registry.register(Counter(
+    'db_slow_queries_total', 'Statements slower than SLOW_QUERY_MS.', ('source',)))
+bcrypt_duration = registry.register(Histogram(
+    'bcrypt_duration_seconds', 'Time spent hashing or verifying passwords.', ('operation',)))
+email_duration = registry.register(Histogram(
+    'email_send_duration_seconds', 'Time spent posting emails to the mail API.', ('outcome',)))
+
+class RequestQueries(threading.local):
+    count = None
+
+current = RequestQueries()
+
+def observe_query(source, statement, elapsed):
+    query_duration.observe(elapsed, source)
+    if current.count is not None:
+        current.count += 1
+    if elapsed * 1000 >= thresholds['slow_query_ms']:
+        slow_queries.inc(source)
+        slow_query_log.warning("slow %s query (%.1f ms): %s", source, elapsed * 1000, ' '.join(statement.split())[:500])
+
+@event.listens_for(Engine, "before_cursor_execute")
+def start_query_timer(connection, cursor, statement, parameters, context, executemany):
+    connection.info.setdefault('query_start', []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def stop_query_timer(connection, cursor, statement, parameters, context, executemany):
+    observe_query('sqlalchemy', statement, time.perf_counter() - connection.info['query_start'].pop())
+
+class TimedCursor(sqlite3.Cursor):
+    """
+    Times execute() on raw sqlite3 connections. Rows a SELECT yields lazily
+    are fetched after the timer stops, so this is the time to the first row.
+    """
+    def execute(self, statement, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(statement, parameters)
+        finally:
+            observe_query('sqlite3', statement, time.perf_counter() - start)
+
+    def executemany(self, statement, parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(statement, parameters)
+        finally:
+            observe_query('sqlite3', statement, time.perf_counter() - start)
+
+class TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, statement, parameters=()):
+        return self.cursor().execute(statement, parameters)
+
+    def executemany(self, statement, parameters):
+        return self.cursor().executemany(statement, parameters)
+
+def endpoint_label():
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+def start_request():
+    g.metrics_start = time.perf_counter()
+    current.count = 0
+
+def finish_request(response):
+    start = g.pop('metrics_start', None)
+    if start is not None:
+        endpoint = endpoint_label()
+        request_duration.observe(time.perf_counter() - start, request.method, endpoint, str(response.status_code))
+        queries_per_request.observe(current.count or 0, endpoint)
+    current.count = None
+    return response
+
+def record_exception(sender, exception, **extra):
+    request_exceptions.inc(endpoint_label(), type(exception).__name__)
+
+def metrics_view():
+    return Response(registry.render(), mimetype=None, content_type=CONTENT_TYPE)
+
+def configure(slow_query_ms):
+    thresholds['slow_query_ms'] = slow_query_ms
+
+def init_app(app):
+    """
+    Times every request and exposes the metrics of this process at /metrics.
+    Call it before registering other after_request hooks so their time is
+    included in the request duration.
+    """
+    app.before_request(start_request)
+    app.after_request(finish_request)
+    got_request_exception.connect(record_exception, app)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
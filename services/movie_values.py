@@ -0,0 +1,65 @@
+from services.catalog_copy import id_chunks, rows_by_ids
+from conf import filters as filters_json
+
+TABLE = filters_json['movies']['table']
+MULTIVALUED = filters_json['movies']['multivalued']
+TERMS_TABLE = filters_json['movies']['terms']
+# Fields mapped to null (cast) are only filtered, through their terms; the
+# join tables list the whole elements of the faceted fields.
+JOIN_TABLES = {field: table for field, table in MULTIVALUED.items() if table}
+# Join tables of earlier layouts that nothing reads anymore.
+DROPPED_TABLES = ['tb_movie_cast']
+VALUE_COLUMNS = ', '.join(f'"{field}"' for field in MULTIVALUED)
+SELECT_VALUES = f"SELECT id, {VALUE_COLUMNS} FROM {TABLE}"
+
+def split_values(value):
+    values = []
+    seen = set()
+    for part in (value or '').split(','):
+        part = part.strip()
+        if part and part.upper() not in seen:
+            seen.add(part.upper())
+            values.append(part)
+    return values
+
+def value_terms(value):
+    """Each value and every run of whole words in it, so 'Dramas' matches 'TV Dramas'."""
+    terms = {}
+    for part in split_values(value):
+        words = part.split()
+        for start in range(len(words)):
+            for end in range(start + 1, len(words) + 1):
+                term = ' '.join(words[start:end])
+                terms.setdefault(term.upper(), term)
+    return list(terms.values())
+
+def insert_movie_values(connection, rows):
+    for position, (field, table) in enumerate(MULTIVALUED.items(), start=1):
+        if table:
+            connection.executemany(
+                f"INSERT INTO {table} (movie_id, name) VALUES (?, ?)",
+                ((row[0], name) for row in rows for name in split_values(row[position])))
+        connection.executemany(
+            f"INSERT INTO {TERMS_TABLE} (field, term, movie_id) VALUES (?, ?, ?)",
+            ((field, term, row[0]) for row in rows for term in value_terms(row[position])))
+
+def sync_movie_values(connection, ids):
+    """Rewrite the join table rows of the given movies from tb_movie."""
+    for chunk, placeholders in id_chunks(ids):
+        for table in [*JOIN_TABLES.values(), TERMS_TABLE]:
+            connection.execute(f"DELETE FROM {table} WHERE movie_id IN ({placeholders})", chunk)
+    insert_movie_values(connection, rows_by_ids(connection, TABLE, f"id, {VALUE_COLUMNS}", ids))
+
+def rebuild_movie_values(connection):
+    for table in [*JOIN_TABLES.values(), TERMS_TABLE]:
+        connection.execute(f"DELETE FROM {table}")
+    insert_movie_values(connection, connection.execute(SELECT_VALUES).fetchall())
+
+def ensure_movie_values(connection):
+    for table in DROPPED_TABLES:
+        connection.execute(f"DROP TABLE IF EXISTS {table}")
+    tables = [*JOIN_TABLES.values(), TERMS_TABLE]
+    if all(connection.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone() for table in tables):
+        return
+    if connection.execute(f"SELECT 1 FROM {TABLE} LIMIT 1").fetchone():
+        rebuild_movie_values(connection)
@@ -0,0 +1,74 @@
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.exceptions import ServiceUnavailable
+from conf import config as config_json
+from services.metrics import bcrypt_duration
+import threading
+
+class PasswordHasherBusy(ServiceUnavailable):
+    description = 'Too many password operations in progress, try again later.'
+
+def hash_password(password, rounds):
+    import bcrypt
+    with bcrypt_duration.time('hash'):
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+def verify_password(password, hashed):
+    import bcrypt
+    with bcrypt_duration.time('verify'):
+        return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+def password_rounds(hashed):
+    try:
+        return int(hashed.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a bounded thread pool (bcrypt releases the GIL) so request
+    threads only wait on a future. When more than workers + max_pending
+    operations are queued, new ones are rejected with 503.
+    """
+    def __init__(self, rounds, workers, max_pending):
+        self.executor = None
+        self.lock = threading.Lock()
+        self.configure(rounds, workers, max_pending)
+
+    def configure(self, rounds, workers, max_pending):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False)
+                self.executor = None
+            self.rounds = rounds
+            self.workers = workers
+            self.slots = threading.BoundedSemaphore(workers + max_pending)
+
+    def submit(self, function, *args):
+        if self.executor is None:
+            with self.lock:
+                if self.executor is None:
+                    self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bcrypt')
+        slots = self.slots
+        if not slots.acquire(blocking=False):
+            raise PasswordHasherBusy(retry_after=1)
+        try:
+            future = self.executor.submit(function, *args)
+        except Exception:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        return future.result()
+
+    def hash(self, password):
+        return self.submit(hash_password, password, self.rounds)
+
+    def verify(self, password, hashed):
+        return self.submit(verify_password, password, hashed)
+
+    def needs_rehash(self, hashed):
+        return password_rounds(hashed) != self.rounds
+
+def hasher_options(config):
+    return config['BCRYPT_ROUNDS'], config['BCRYPT_WORKERS'], config['BCRYPT_MAX_PENDING']
+
+hasher = PasswordHasher(*hasher_options(config_json))
@@ -0,0 +1,93 @@
+from conf import filters as filters_json
+import re
+
+TABLE = filters_json['movies']['table']
+SEARCH_TABLE = f"{TABLE}_fts"
+KEY_TABLE = f"{TABLE}_fts_key"
+CONTENT_VIEW = f"{TABLE}_fts_content"
+SEARCH_COLUMNS = ['title', 'description', 'director', 'cast']
+SEARCH_WEIGHTS = [10.0, 1.0, 5.0, 3.0]
+TOKEN = re.compile(r'\w+\*?', re.UNICODE)
+
+def ensure_search_index(connection):
+    """
+    The FTS5 index reads its text from tb_movie through a view keyed on
+    KEY_TABLE, whose INTEGER PRIMARY KEY survives VACUUM. tb_movie's own
+    rowid does not (its primary key is TEXT), so it cannot be the key.
+    Runs in the caller's transaction, which commits it.
+    """
+    exists = connection.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (KEY_TABLE,)).fetchone()
+    if not exists:
+        # Indexes created before the key table used tb_movie's rowid.
+        drop_search_triggers(connection)
+        connection.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+    columns = ', '.join(f'"{column}"' for column in SEARCH_COLUMNS)
+    movie_columns = ', '.join(f'movie."{column}"' for column in SEARCH_COLUMNS)
+    new_columns = ', '.join(f'new."{column}"' for column in SEARCH_COLUMNS)
+    old_columns = ', '.join(f'old."{column}"' for column in SEARCH_COLUMNS)
+    statements = [
+        f"""CREATE TABLE IF NOT EXISTS {KEY_TABLE} (
+            key INTEGER PRIMARY KEY,
+            movie_id TEXT NOT NULL UNIQUE)""",
+        f"""CREATE VIEW IF NOT EXISTS {CONTENT_VIEW} AS
+            SELECT search_key.key AS key, {movie_columns}
+            FROM {KEY_TABLE} AS search_key JOIN {TABLE} AS movie ON movie.id = search_key.movie_id""",
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+            {columns}, content='{CONTENT_VIEW}', content_rowid='key',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3')""",
+        f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_ai AFTER INSERT ON {TABLE} BEGIN
+            INSERT OR IGNORE INTO {KEY_TABLE}(movie_id) VALUES (new.id);
+            INSERT INTO {SEARCH_TABLE}(rowid, {columns})
+                SELECT key, {new_columns} FROM {KEY_TABLE} WHERE movie_id = new.id;
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_ad AFTER DELETE ON {TABLE} BEGIN
+            INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, {columns})
+                SELECT 'delete', key, {old_columns} FROM {KEY_TABLE} WHERE movie_id = old.id;
+            DELETE FROM {KEY_TABLE} WHERE movie_id = old.id;
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_au AFTER UPDATE ON {TABLE} BEGIN
+            INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, {columns})
+                SELECT 'delete', key, {old_columns} FROM {KEY_TABLE} WHERE movie_id = old.id;
+            UPDATE {KEY_TABLE} SET movie_id = new.id WHERE movie_id = old.id;
+            INSERT INTO {SEARCH_TABLE}(rowid, {columns})
+                SELECT key, {new_columns} FROM {KEY_TABLE} WHERE movie_id = new.id;
+        END""",
+    ]
+    for statement in statements:
+        connection.execute(statement)
+    if not exists:
+        rebuild_search_index(connection)
+
+def drop_search_triggers(connection):
+    for suffix in ('ai', 'ad', 'au'):
+        connection.execute(f"DROP TRIGGER IF EXISTS {SEARCH_TABLE}_{suffix}")
+
+def rebuild_search_index(connection):
+    connection.execute(f"DELETE FROM {KEY_TABLE} WHERE movie_id NOT IN (SELECT id FROM {TABLE})")
+    connection.execute(f"INSERT OR IGNORE INTO {KEY_TABLE}(movie_id) SELECT id FROM {TABLE}")
+    connection.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')")
+
+def match_expression(q, prefix=False):
+    terms = []
+    for token in TOKEN.findall(q):
+        is_prefix = prefix or token.endswith('*')
+        token = token.rstrip('*')
+        terms.append(f'"{token}"*' if is_prefix else f'"{token}"')
+    return ' '.join(terms)
+
+def search_movies(connection, q, limit, prefix=False):
+    expression = match_expression(q, prefix)
+    if not expression:
+        return []
+    weights = ', '.join(str(weight) for weight in SEARCH_WEIGHTS)
+    query = f"""
+        SELECT movie.*, bm25({SEARCH_TABLE}, {weights}) AS score,
+               snippet({SEARCH_TABLE}, -1, '<b>', '</b>', '...', 12) AS snippet
+        FROM {SEARCH_TABLE}
+        JOIN {KEY_TABLE} AS search_key ON search_key.key = {SEARCH_TABLE}.rowid
+        JOIN {TABLE} AS movie ON movie.id = search_key.movie_id
+        WHERE {SEARCH_TABLE} MATCH ?
+        ORDER BY score LIMIT ?
+    """
+    return connection.execute(query, (expression, limit))
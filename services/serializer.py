@@ -0,0 +1,86 @@
+from datetime import date, datetime
+from flask import Response
+from functools import lru_cache
+from json.encoder import encode_basestring_ascii
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def dumps(value):
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+@lru_cache(maxsize=8192)
+def format_datetime(value):
+    """Same text as strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z', cached per value."""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.isoformat(timespec='milliseconds') + 'Z'
+    if isinstance(value, date):
+        return value.isoformat() + 'T00:00:00.000Z'
+    return value
+
+def encode_value(value):
+    if value is None:
+        return 'null'
+    if value.__class__ is str:
+        return encode_basestring_ascii(value)
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    return repr(value)
+
+class RowEncoder:
+    """
+    Encodes cursor rows as JSON objects keyed by the cursor columns. With
+    orjson the rows are zipped into dicts and encoded in C; without it each
+    row is formatted into a template built once for the column list.
+    """
+    def __init__(self, columns):
+        self.columns = tuple(columns)
+        self.template = '{' + ','.join(f'{encode_basestring_ascii(column)}:%s' for column in self.columns) + '}'
+
+    def dicts(self, rows):
+        columns = self.columns
+        return [dict(zip(columns, row)) for row in rows]
+
+    def encode_rows(self, rows):
+        if orjson is not None:
+            return orjson.dumps(self.dicts(rows))
+        template = self.template
+        return ('[' + ','.join(template % tuple(map(encode_value, row)) for row in rows) + ']').encode('utf-8')
+
+    def encode_lines(self, rows):
+        """NDJSON: one object per line."""
+        if orjson is not None:
+            columns = self.columns
+            return b''.join(orjson.dumps(dict(zip(columns, row))) + b'\n' for row in rows)
+        template = self.template
+        return ''.join(template % tuple(map(encode_value, row)) + '\n' for row in rows).encode('utf-8')
+
+@lru_cache(maxsize=64)
+def row_encoder(columns):
+    return RowEncoder(columns)
+
+def columns_of(cursor):
+    return tuple(column[0] for column in cursor.description)
+
+def encode_envelope(key, rows, columns, **fields):
+    """{key: [rows...], **fields} without building the whole payload as dicts first."""
+    body = b'{' + dumps(key) + b':' + row_encoder(tuple(columns)).encode_rows(rows)
+    if fields:
+        body += b',' + dumps(fields)[1:]
+    else:
+        body += b'}'
+    return body
+
+def json_response(body, status=200, headers=None):
+    if not isinstance(body, bytes):
+        body = dumps(body)
+    return Response(body, status=status, headers=headers, mimetype='application/json')
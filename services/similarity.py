@@ -0,0 +1,313 @@
+from services.catalog_copy import CatalogCopy
+from services.movie_values import split_values
+from services.versioning import current_version
+from sql_pool import pool
+from conf import config as config_json
+from conf import filters as filters_json
+from contextlib import contextmanager
+import json
+import numpy as np
+import os
+import re
+import zlib
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+MAGIC = 0x314D4953
+LAYOUT = 1
+HEADER = ('magic', 'layout', 'version', 'count', 'capacity', 'dimensions', 'deleted', 'edits')
+HEADER_BYTES = 8 * len(HEADER)
+ID_BYTES = 16
+CHUNK_ROWS = 4096
+GROWTH = 1.25
+WORD = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+    a about after all an and are as at be before but by for from has have he her him his how in into is it its
+    must new not of on one only or out over own she than that the their them then they this to two up was were
+    what when where which while who whose will with""".split())
+
+def lock_exclusive(lock_file):
+    if fcntl is not None:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return
+    lock_file.seek(0)
+    while True:
+        try:
+            # LK_LOCK gives up after about ten seconds; a rebuild may take longer.
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            continue
+
+def unlock(lock_file):
+    if fcntl is not None:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return
+    lock_file.seek(0)
+    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+def field_terms(field, value):
+    if field == 'description':
+        return [word for word in WORD.findall((value or '').lower()) if len(word) > 2 and word not in STOPWORDS]
+    return [f"{field}:{name.lower()}" for name in split_values(value)]
+
+def hash_terms(rows, fields, dimensions):
+    """Per field, the (row, bucket, sign) arrays of the hashed terms of each row."""
+    hashed = []
+    for position, field in enumerate(fields, start=1):
+        slots, buckets, signs = [], [], []
+        for slot, row in enumerate(rows):
+            for term in field_terms(field, row[position]):
+                digest = zlib.crc32(term.encode('utf-8'))
+                slots.append(slot)
+                buckets.append(digest % dimensions)
+                signs.append(1.0 if digest & 0x80000000 else -1.0)
+        hashed.append((np.array(slots, dtype=np.int64), np.array(buckets, dtype=np.int64),
+                       np.array(signs, dtype=np.float32)))
+    return hashed
+
+def term_frequencies(count, terms, dimensions):
+    slots, buckets, signs = terms
+    counts = np.bincount(slots * dimensions + buckets, weights=signs, minlength=count * dimensions)
+    counts = counts.reshape(count, dimensions).astype(np.float32)
+    return np.sign(counts) * np.log1p(np.abs(counts))
+
+def normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+def encode(count, hashed, idf, weights, dimensions):
+    """Unit vectors: each field's TF-IDF part normalized, weighted and summed."""
+    vectors = np.zeros((count, dimensions), dtype=np.float32)
+    for position, terms in enumerate(hashed):
+        vectors += weights[position] * normalize(term_frequencies(count, terms, dimensions) * idf[position])
+    return normalize(vectors)
+
+class SimilarityIndex(CatalogCopy):
+    """
+    Hashed TF-IDF vectors of every movie in one memory-mapped file shared by
+    the workers: a header, the IDF weights, the ids and the vectors. Writes
+    update their rows in place under a file lock; a full rebuild writes a new
+    file and replaces it, and the other workers map the new file when they
+    see it. Similar titles are a cosine top-k over the mapped matrix.
+    """
+    def __init__(self, pool, table, path, dimensions, weights):
+        super().__init__(pool, table)
+        self.lock_file = None
+        self.configure(path, dimensions, weights)
+
+    def configure(self, path, dimensions, weights):
+        with self.lock:
+            self.detach()
+            self.path = path
+            self.dimensions = dimensions
+            self.fields = list(weights)
+            self.weights = [weights[field] for field in self.fields]
+            self.select_columns = ', '.join(['id'] + [f'"{field}"' for field in self.fields])
+
+    @property
+    def layout(self):
+        description = json.dumps({'layout': LAYOUT, 'dimensions': self.dimensions,
+                                  'fields': self.fields, 'weights': self.weights})
+        return zlib.crc32(description.encode('utf-8'))
+
+    @contextmanager
+    def file_lock(self):
+        """Excludes the other workers; re-entrant for the thread holding self.lock."""
+        with self.lock:
+            if self.lock_file is not None:
+                yield
+                return
+            with open(self.path + '.lock', 'a+') as lock_file:
+                lock_exclusive(lock_file)
+                self.lock_file = lock_file
+                try:
+                    yield
+                finally:
+                    self.lock_file = None
+                    unlock(lock_file)
+
+    def offsets(self, capacity):
+        idf_end = HEADER_BYTES + len(self.fields) * self.dimensions * 4
+        ids_end = idf_end + capacity * ID_BYTES
+        return idf_end, ids_end, ids_end + capacity * self.dimensions * 4
+
+    def attach(self, mapping):
+        self.mapping = mapping
+        self.header = mapping[:HEADER_BYTES].view(np.int64)
+        idf_end, ids_end, end = self.offsets(int(self.header[HEADER.index('capacity')]))
+        self.idf = mapping[HEADER_BYTES:idf_end].view(np.float32).reshape(len(self.fields), self.dimensions)
+        self.ids = mapping[idf_end:ids_end].view(f"S{ID_BYTES}")
+        self.vectors = mapping[ids_end:end].view(np.float32).reshape(-1, self.dimensions)
+
+    def detach(self):
+        """Drops every view of the mapped file, which closes it once no result refers to it."""
+        self.inode = self.mapping = None
+        self.header = self.idf = self.ids = self.vectors = None
+
+    def get(self, field):
+        return int(self.header[HEADER.index(field)])
+
+    def set(self, field, value):
+        self.header[HEADER.index(field)] = value
+
+    @property
+    def loaded(self):
+        return self.reopen()
+
+    @property
+    def version(self):
+        return self.get('version') if self.mapping is not None else None
+
+    @version.setter
+    def version(self, version):
+        # -1 never matches the catalog, so the next sync rebuilds.
+        self.set('version', -1 if version is None else version)
+
+    def reopen(self):
+        """Maps the file when it is not mapped yet or a rebuild replaced it."""
+        try:
+            inode = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            self.detach()
+            return False
+        if inode == self.inode and self.mapping is not None:
+            return True
+        mapping = np.memmap(self.path, dtype=np.uint8, mode='r+')
+        header = mapping[:HEADER_BYTES].view(np.int64)
+        if header[0] != MAGIC or header[1] != self.layout or header[HEADER.index('dimensions')] != self.dimensions:
+            del header, mapping
+            self.detach()
+            return False
+        self.inode = inode
+        self.attach(mapping)
+        return True
+
+    def build(self, capacity=None):
+        """Vectorizes the whole table into a new file and maps it."""
+        with self.pool.read() as connection:
+            version = current_version(connection)[0]
+            cursor = connection.execute(f"SELECT {self.select_columns} FROM {self.table} ORDER BY id")
+            chunks = []
+            document_frequency = np.zeros((len(self.fields), self.dimensions), dtype=np.float64)
+            while True:
+                rows = cursor.fetchmany(CHUNK_ROWS)
+                if not rows:
+                    break
+                hashed = hash_terms(rows, self.fields, self.dimensions)
+                for position, terms in enumerate(hashed):
+                    document_frequency[position] += (term_frequencies(len(rows), terms, self.dimensions) != 0).sum(axis=0)
+                chunks.append(([row[0] for row in rows], hashed))
+        count = sum(len(ids) for ids, _ in chunks)
+        capacity = max(capacity or 0, int(count * GROWTH) + 64)
+        temporary = f"{self.path}.{os.getpid()}.tmp"
+        with open(temporary, 'wb') as file:
+            file.truncate(self.offsets(capacity)[2])
+        mapping = np.memmap(temporary, dtype=np.uint8, mode='r+')
+        mapping[:HEADER_BYTES].view(np.int64)[:] = [MAGIC, self.layout, version, count, capacity, self.dimensions, 0, 0]
+        self.attach(mapping)
+        self.idf[:] = np.log((1 + count) / (1 + document_frequency)) + 1
+        slot = 0
+        for ids, hashed in chunks:
+            self.ids[slot:slot + len(ids)] = ids
+            self.vectors[slot:slot + len(ids)] = encode(len(ids), hashed, self.idf, self.weights, self.dimensions)
+            slot += len(ids)
+        mapping.flush()
+        # Windows cannot rename a mapped file, nor replace one: unmap both first.
+        del mapping
+        self.detach()
+        os.replace(temporary, self.path)
+        self.reopen()
+
+    def load(self):
+        with self.lock, self.file_lock():
+            self.build()
+
+    def reload(self, version):
+        with self.file_lock():
+            if not self.reopen() or self.get('version') != version:
+                self.build()
+
+    def sync_current(self):
+        """Syncs with the catalog version in the database, building the file if needed."""
+        with self.pool.read() as connection:
+            version = current_version(connection)[0]
+        self.sync(version)
+
+    def find(self, ids):
+        """Slots of the given ids that are in the index."""
+        keys = np.array([str(id).encode('utf-8') for id in ids], dtype=f"S{ID_BYTES}")
+        if len(keys) == 1:
+            slots = np.flatnonzero(self.ids[:self.get('count')] == keys[0])
+        else:
+            slots = np.flatnonzero(np.isin(self.ids[:self.get('count')], keys))
+        return {self.ids[slot].decode('utf-8'): int(slot) for slot in slots}
+
+    def refresh(self, *ids):
+        """Re-vectorizes the given movies after they were written, under the file lock."""
+        with self.lock:
+            if not self.loaded:
+                return
+            with self.file_lock():
+                super().refresh(*ids)
+                if self.mapping is not None:
+                    self.mapping.flush()
+
+    def invalidate(self):
+        # The header still holds the version before the write, so the next
+        # sync rebuilds the file; this worker maps it again from scratch.
+        with self.lock:
+            self.detach()
+
+    def apply(self, ids, rows):
+        slots = self.find(ids)
+        count = self.get('count')
+        present = {row[0] for row in rows}
+        removed = set(slots) - present
+        appended = len(present - set(slots))
+        deleted = self.get('deleted') + len(removed)
+        if count + appended > self.get('capacity') or deleted > count // 4:
+            self.build(int((count + appended) * GROWTH))
+            return
+        for id in removed:
+            self.ids[slots[id]] = b''
+            self.vectors[slots[id]] = 0
+        vectors = encode(len(rows), hash_terms(rows, self.fields, self.dimensions),
+                         self.idf, self.weights, self.dimensions)
+        for row, vector in zip(rows, vectors):
+            slot = slots.get(row[0])
+            if slot is None:
+                slot = count
+                count += 1
+                self.ids[slot] = row[0]
+            self.vectors[slot] = vector
+        self.set('count', count)
+        self.set('deleted', deleted)
+        self.set('edits', self.get('edits') + 1)
+
+    def similar(self, id, k):
+        """(id, cosine) of the k nearest movies, None when the movie is not indexed."""
+        with self.lock:
+            slot = self.find([id]).get(str(id))
+            if slot is None:
+                return None
+            count = self.get('count')
+            query = np.array(self.vectors[slot])
+            if not query.any() or count < 2:
+                return []
+            scores = self.vectors[:count] @ query
+            scores[slot] = -1
+            k = min(k, count - 1)
+            top = np.argpartition(scores, -k)[-k:]
+            top = top[np.argsort(-scores[top], kind='stable')]
+            return [(self.ids[slot].decode('utf-8'), float(scores[slot])) for slot in top if scores[slot] > 0]
+
+def similarity_options(config):
+    return config['SIMILAR_INDEX_FILE'], config['SIMILAR_DIMENSIONS'], config['SIMILAR_FIELD_WEIGHTS']
+
+similarity = SimilarityIndex(pool, filters_json['movies']['table'], *similarity_options(config_json))
@@ -0,0 +1,52 @@
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+import threading
+
+TEMPLATE_FOLDER = 'templates'
+
+class TemplateCache:
+    """
+    Compiles every template once and keeps the compiled objects, so rendering
+    an email or a confirmation page never reads the disk. Templates without
+    variables can be served as pre-rendered bytes. With auto_reload (debug)
+    Jinja checks the file modification time and recompiles changed templates.
+    """
+    def __init__(self, folder):
+        self.folder = folder
+        self.lock = threading.Lock()
+        self.environment = None
+        self.templates = {}
+        self.rendered = {}
+
+    def load(self, auto_reload=False):
+        environment = Environment(loader=FileSystemLoader(self.folder),
+                                  autoescape=select_autoescape(),
+                                  auto_reload=auto_reload,
+                                  cache_size=-1)
+        templates = {name: environment.get_template(name) for name in environment.list_templates()}
+        with self.lock:
+            self.environment = environment
+            self.templates = templates
+            self.rendered = {}
+
+    def get(self, name):
+        if self.environment is None:
+            self.load()
+        if self.environment.auto_reload:
+            template = self.environment.get_template(name)
+            self.templates[name] = template
+            return template
+        return self.templates.get(name) or self.environment.get_template(name)
+
+    def render(self, name, **context):
+        return self.get(name).render(**context)
+
+    def static(self, name):
+        """Bytes of a template that takes no variables, rendered once per compilation."""
+        template = self.get(name)
+        cached = self.rendered.get(name)
+        if cached is None or cached[0] is not template:
+            cached = (template, template.render().encode('utf-8'))
+            self.rendered[name] = cached
+        return cached[1]
+
+templates = TemplateCache(TEMPLATE_FOLDER)
@@ -0,0 +1,45 @@
+from flask import request, Response
+from werkzeug.http import http_date, quote_etag
+from datetime import datetime, timezone
+from conf import config as config_json
+import hashlib
+
+VERSION_TABLE = config_json['SQLALCHEMY_CATALOG_VERSION_TABLE']
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def current_version(connection):
+    row = connection.execute(f"SELECT version, modify_date FROM {VERSION_TABLE} WHERE id = 1").fetchone()
+    if row is None:
+        return 0, None
+    version, modify_date = row
+    if isinstance(modify_date, str):
+        modify_date = datetime.fromisoformat(modify_date)
+    return version, modify_date
+
+def bump_version(connection):
+    connection.execute(f"""
+        INSERT INTO {VERSION_TABLE} (id, version, modify_date) VALUES (1, 1, ?)
+        ON CONFLICT(id) DO UPDATE SET version = version + 1, modify_date = excluded.modify_date
+    """, (utcnow().isoformat(sep=' '),))
+
+def make_etag(version, *parts):
+    digest = hashlib.sha1('\x1f'.join(str(part) for part in parts).encode('utf-8')).hexdigest()[:16]
+    return f"v{version}-{digest}"
+
+def cache_headers(etag, modify_date):
+    headers = {'ETag': quote_etag(etag)}
+    if modify_date is not None:
+        headers['Last-Modified'] = http_date(modify_date.replace(tzinfo=timezone.utc))
+    return headers
+
+def is_not_modified(etag, modify_date):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and modify_date is not None:
+        return modify_date.replace(tzinfo=timezone.utc, microsecond=0) <= request.if_modified_since
+    return False
+
+def not_modified(headers):
+    return Response(status=304, headers=headers)
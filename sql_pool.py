@@ -0,0 +1,118 @@
+from contextlib import contextmanager
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from conf import config
+from services.metrics import TimedConnection
+import queue
+import sqlite3
+import threading
+
+WRITE_PRAGMAS = ('journal_mode', 'synchronous')
+
+def apply_pragmas(connection, readonly=False, pragmas=None):
+    for name, value in (config['SQLITE_PRAGMAS'] if pragmas is None else pragmas).items():
+        if readonly and name in WRITE_PRAGMAS:
+            continue
+        connection.execute(f"PRAGMA {name} = {value}")
+
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        apply_pragmas(dbapi_connection, pragmas=pool.pragmas)
+
+class ConnectionPool:
+    """
+    Pool of read-only sqlite3 connections to the SQLAlchemy database file.
+    Connections keep their prepared statement cache between requests.
+    """
+    def __init__(self, size, cached_statements, pragmas):
+        self.size = size
+        self.cached_statements = cached_statements
+        self.pragmas = pragmas
+        self.database = None
+        self.connections = queue.LifoQueue(maxsize=size)
+        self.lock = threading.Lock()
+
+    def configure(self, database, size=None, cached_statements=None, pragmas=None):
+        """Points the pool at the database; the other arguments replace the ones given at creation."""
+        with self.lock:
+            self.database = database
+            self.clear()
+            if size is not None and size != self.size:
+                self.size = size
+                self.connections = queue.LifoQueue(maxsize=size)
+            if cached_statements is not None:
+                self.cached_statements = cached_statements
+            if pragmas is not None:
+                self.pragmas = pragmas
+        with self.write() as connection:
+            connection.execute("SELECT 1")
+
+    def resolve(self):
+        if self.database is None:
+            from sql_alchemy import db
+            self.configure(db.engine.url.database)
+        return self.database
+
+    def connect(self, readonly=True):
+        database = self.resolve()
+        if readonly:
+            connection = sqlite3.connect(f"file:{database}?mode=ro", uri=True,
+                                         check_same_thread=False,
+                                         cached_statements=self.cached_statements,
+                                         factory=TimedConnection)
+        else:
+            connection = sqlite3.connect(database, check_same_thread=False,
+                                         cached_statements=self.cached_statements,
+                                         factory=TimedConnection)
+        apply_pragmas(connection, readonly, self.pragmas)
+        return connection
+
+    def acquire(self):
+        try:
+            return self.connections.get_nowait()
+        except queue.Empty:
+            return self.connect()
+
+    def release(self, connection):
+        if connection.in_transaction:
+            connection.rollback()
+        try:
+            self.connections.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    @contextmanager
+    def read(self):
+        connection = self.acquire()
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+    @contextmanager
+    def write(self):
+        connection = self.connect(readonly=False)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def warm(self, count=None):
+        """Opens the read connections up front so the first requests do not pay for it."""
+        connections = [self.acquire() for _ in range(count or self.size)]
+        for connection in connections:
+            self.release(connection)
+
+    def clear(self):
+        while True:
+            try:
+                self.connections.get_nowait().close()
+            except queue.Empty:
+                break
+
+def pool_options(config):
+    return config['SQLITE_POOL_SIZE'], config['SQLITE_CACHED_STATEMENTS'], config['SQLITE_PRAGMAS']
+
+pool = ConnectionPool(*pool_options(config))
@@ -0,0 +1,130 @@
+"""
+Outbox delivery against a local stub of the mail API. Run from the
+repository root:
+
+    python -m pytest tests
+"""
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from models.email_outbox import EmailOutboxModel
+from services.mailer import MailDeliveryWorker, OUTBOX_TABLE, timestamp
+from services.versioning import utcnow
+from sql_pool import ConnectionPool
+from sqlalchemy import create_engine
+from urllib.parse import parse_qs
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+BACKOFF_BASE = 60
+
+class StubMailHandler(BaseHTTPRequestHandler):
+    """Answers each message with the status configured for its recipient."""
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        form = parse_qs(self.rfile.read(length).decode('utf-8'))
+        recipient = form['to'][0].strip('<>')
+        self.server.received.append((recipient, form, self.headers.get('Authorization')))
+        status = self.server.statuses.get(recipient, 200)
+        body = b'{"message": "stub"}'
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class MailDeliveryTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubMailHandler)
+        self.server.statuses = {}
+        self.server.received = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.directory = tempfile.mkdtemp(prefix='mailer-')
+        database = os.path.join(self.directory, 'outbox.db')
+        engine = create_engine(f"sqlite:///{database}")
+        EmailOutboxModel.__table__.create(engine)
+        engine.dispose()
+        self.pool = ConnectionPool(2, 16, {'journal_mode': 'WAL', 'busy_timeout': 5000})
+        self.pool.configure(database)
+
+        host, port = self.server.server_address
+        self.worker = MailDeliveryWorker(self.pool, f"http://{host}:{port}/messages", 'key', 'no-reply <test@example.com>',
+                                         batch_size=10, timeout=5, max_attempts=3, backoff_base=BACKOFF_BASE,
+                                         backoff_max=3600, lease=300, poll_interval=1, enabled=False)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.pool.clear()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def enqueue(self, recipient, attempts=0):
+        now = timestamp(utcnow())
+        with self.pool.write() as connection:
+            return connection.execute(f"""
+                INSERT INTO {OUTBOX_TABLE} (recipient, subject, html, status, attempts, next_attempt_date, create_date)
+                VALUES (?, 'Subject', '<p>Body</p>', 'pending', ?, ?, ?)
+            """, (recipient, attempts, now, now)).lastrowid
+
+    def message(self, id):
+        with self.pool.read() as connection:
+            return connection.execute(
+                f"SELECT status, attempts, last_error, next_attempt_date, sent_date FROM {OUTBOX_TABLE} WHERE id = ?",
+                (id,)).fetchone()
+
+    def test_success_marks_the_message_sent(self):
+        id = self.enqueue('ok@example.com')
+        self.assertEqual(self.worker.drain(), 1)
+        status, attempts, last_error, _, sent_date = self.message(id)
+        self.assertEqual((status, attempts, last_error), ('sent', 1, None))
+        self.assertIsNotNone(sent_date)
+        recipient, form, authorization = self.server.received[0]
+        self.assertEqual(recipient, 'ok@example.com')
+        self.assertEqual(form['subject'], ['Subject'])
+        self.assertTrue(authorization.startswith('Basic '))
+
+    def test_server_error_reschedules_with_backoff(self):
+        self.server.statuses['busy@example.com'] = 503
+        id = self.enqueue('busy@example.com')
+        before = utcnow()
+        self.assertEqual(self.worker.drain(), 1)
+        status, attempts, last_error, next_attempt_date, sent_date = self.message(id)
+        self.assertEqual((status, attempts, sent_date), ('pending', 1, None))
+        self.assertIn('HTTP 503', last_error)
+        # The first retry waits between half and all of backoff_base.
+        self.assertGreaterEqual(next_attempt_date, timestamp(before + timedelta(seconds=BACKOFF_BASE * 0.5)))
+        self.assertLessEqual(next_attempt_date, timestamp(utcnow() + timedelta(seconds=BACKOFF_BASE)))
+        # Not due yet, so the next drain does not send it again.
+        self.assertEqual(self.worker.drain(), 0)
+        self.assertEqual(len(self.server.received), 1)
+
+    def test_server_error_on_the_last_attempt_marks_the_message_failed(self):
+        self.server.statuses['busy@example.com'] = 500
+        id = self.enqueue('busy@example.com', attempts=2)
+        self.worker.drain()
+        status, attempts, last_error, _, _ = self.message(id)
+        self.assertEqual((status, attempts), ('failed', 3))
+        self.assertIn('HTTP 500', last_error)
+
+    def test_client_error_marks_the_message_failed(self):
+        self.server.statuses['bad@example.com'] = 400
+        id = self.enqueue('bad@example.com')
+        self.assertEqual(self.worker.drain(), 1)
+        status, attempts, last_error, _, sent_date = self.message(id)
+        self.assertEqual((status, attempts, sent_date), ('failed', 1, None))
+        self.assertIn('HTTP 400', last_error)
+
+    def test_rate_limit_is_retried(self):
+        self.server.statuses['slow@example.com'] = 429
+        id = self.enqueue('slow@example.com')
+        self.worker.drain()
+        self.assertEqual(self.message(id)[0], 'pending')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+"""
+EXPLAIN QUERY PLAN checks on a catalog loaded from database/netflix_titles.csv
+into a temporary database: the /movies queries for every filter of
+database/filters.json, alone and combined as in its composite indexes, go
+through an index instead of a scan of the movie table, and range filters and
+sort keys read an index in order instead of sorting. Run from the repository
+root:
+
+    python -m pytest tests/test_query_plans.py
+"""
+from conf import filters as filters_json
+from database.migration import CSV_FILE, load
+from resources.movie import build_keyset, build_order, build_ranges, build_where, sort_order
+from services.indexes import configured_indexes
+from services.movie_values import TERMS_TABLE
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+TABLE = filters_json['movies']['table']
+
+def sample_value(connection, key):
+    if key in filters_json['movies']['multivalued']:
+        query = f"SELECT term FROM {TERMS_TABLE} WHERE field = ? GROUP BY term ORDER BY COUNT(*) DESC LIMIT 1"
+        row = connection.execute(query, (key,)).fetchone()
+    else:
+        query = f'SELECT "{key}" FROM {TABLE} WHERE "{key}" IS NOT NULL GROUP BY 1 ORDER BY COUNT(*) DESC LIMIT 1'
+        row = connection.execute(query).fetchone()
+    return str(row[0]) if row else 'x'
+
+def filter_combinations():
+    keys = filters_json['movies']['filters']
+    combinations = [[key] for key in keys]
+    for columns in configured_indexes():
+        if columns not in combinations and all(column in keys for column in columns):
+            combinations.append(columns)
+    multivalued = list(filters_json['movies']['multivalued'])
+    scalar = [key for key in keys if key not in multivalued]
+    if multivalued and scalar:
+        combinations.append([multivalued[0], scalar[0]])
+    return combinations
+
+def queries(connection, keys):
+    filters = {key: sample_value(connection, key) for key in keys}
+    where_clauses, values = build_where(filters)
+    where = " WHERE " + " AND ".join(where_clauses)
+    yield 'page', f"SELECT * FROM {TABLE}{where} ORDER BY id LIMIT ?", values + [101]
+    yield 'next page', f"SELECT * FROM {TABLE}{where} AND id > ? ORDER BY id LIMIT ?", values + ['5', 101]
+    yield 'count', f"SELECT COUNT(*) FROM {TABLE}{where}", values
+
+def sample_bounds(connection, column):
+    # The most recent value gives a narrow range, the common "latest titles" query.
+    high = connection.execute(f'SELECT MAX("{column}") FROM {TABLE}').fetchone()[0]
+    return [(column, '>=', high), (column, '<=', high)]
+
+def sorted_queries(connection, column, descending):
+    order = sort_order([(column, descending)])
+    first = connection.execute(f"SELECT \"{column}\", id FROM {TABLE} ORDER BY {build_order(order)} LIMIT 1").fetchone()
+    keyset_clauses, keyset_values = build_keyset(order, list(first))
+    yield 'page', f"SELECT * FROM {TABLE} ORDER BY {build_order(order)} LIMIT ?", [101]
+    where = " WHERE " + " AND ".join(keyset_clauses)
+    yield 'next page', f"SELECT * FROM {TABLE}{where} ORDER BY {build_order(order)} LIMIT ?", keyset_values + [101]
+    if column in filters_json['movies'].get('ranges', {}):
+        range_clauses, range_values = build_ranges(sample_bounds(connection, column))
+        where = " WHERE " + " AND ".join(range_clauses)
+        yield 'range', f"SELECT * FROM {TABLE}{where} ORDER BY {build_order(order)} LIMIT ?", range_values + [101]
+        yield 'range count', f"SELECT COUNT(*) FROM {TABLE}{where}", range_values
+
+def sort_keys():
+    keys = list(filters_json['movies'].get('sortable', []))
+    return keys + [key for key in filters_json['movies'].get('ranges', {}) if key not in keys]
+
+class QueryPlanTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp(prefix='query-plans-')
+        database = os.path.join(cls.directory, 'movie.db')
+        load(CSV_FILE, database, verbose=False)
+        cls.connection = sqlite3.connect(database, isolation_level=None)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.connection.close()
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def plan(self, query, values):
+        return [row[3] for row in self.connection.execute(f"EXPLAIN QUERY PLAN {query}", values)]
+
+    def test_filters_do_not_scan_the_table(self):
+        for keys in filter_combinations():
+            for name, query, values in queries(self.connection, keys):
+                with self.subTest(filters='+'.join(keys), query=name):
+                    plan = self.plan(query, values)
+                    self.assertEqual([detail for detail in plan if detail.startswith(f"SCAN {TABLE}")], [], plan)
+
+    def test_sorts_and_ranges_read_an_index_in_order(self):
+        for key in sort_keys():
+            for descending in (False, True):
+                for name, query, values in sorted_queries(self.connection, key, descending):
+                    with self.subTest(sort=f"{'-' if descending else ''}{key}", query=name):
+                        plan = self.plan(query, values)
+                        scans = [detail for detail in plan
+                                 if detail == f"SCAN {TABLE}" or detail.startswith("USE TEMP B-TREE")]
+                        self.assertEqual(scans, [], plan)
+
+if __name__ == '__main__':
+    unittest.main()